@@ -0,0 +1,61 @@
+# accounts/authentication.py
+import threading
+import time
+from collections import OrderedDict
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+USER_CACHE_SIZE = 1024  # プロセス内に保持するユーザー数
+USER_CACHE_TIMEOUT = 60  # ユーザー情報を再読み込みするまでの秒数
+
+
+# 最近認証したユーザーを保持するLRUキャッシュ（期限付き）
+class UserCache:
+    def __init__(self, max_size=USER_CACHE_SIZE, timeout=USER_CACHE_TIMEOUT):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._users = OrderedDict()  # user_id -> (読み込み時刻, user)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is None:
+                return None
+            loaded_at, user = entry
+            if time.monotonic() - loaded_at > self.timeout:
+                del self._users[user_id]
+                return None
+            self._users.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user):
+        with self._lock:
+            self._users[user_id] = (time.monotonic(), user)
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_size:
+                self._users.popitem(last=False)
+
+    # 退会・無効化したユーザーをすぐに認証できなくする
+    def invalidate(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+# ユーザーの読み込みをLRUキャッシュ経由にしたJWT認証（ヒット時はDBに問い合わせない）
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user)
+        return user
@@ -0,0 +1,33 @@
+# accounts/backends.py
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from rest_framework.request import Request
+from .hashing import PasswordHashingBusy, check_user_password, hash_password
+
+UserModel = get_user_model()
+
+
+# パスワード照合を専用スレッド（hashing_pool）で行う認証バックエンド
+class PooledHashingModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        try:
+            return self._authenticate_pooled(request, username, password, **kwargs)
+        except PasswordHashingBusy:
+            # API のログインは 503 を返す。管理画面など API 以外では 500 にせず、その場で照合する
+            if isinstance(request, Request):
+                raise
+            return super().authenticate(request, username, password, **kwargs)
+
+    def _authenticate_pooled(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = UserModel._default_manager.get_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # 存在しないユーザーでも同じだけ時間をかける（ModelBackendと同じ）
+            hash_password(password)
+        else:
+            if check_user_password(user, password) and self.user_can_authenticate(user):
+                return user
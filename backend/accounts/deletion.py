@@ -0,0 +1,60 @@
+# accounts/deletion.py
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from stockmanager.controller import release_symbols
+from stockmanager.models import StockSymbol
+from .authentication import user_cache
+from .models import CustomUser
+
+DELETE_BATCH_SIZE = 1000  # 1回のDELETEで削除する件数
+
+# 退会ユーザーの関連データをリクエスト外で削除するためのワーカー
+_deletion_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="account-deletion")
+
+
+# 退会を受け付け、すぐにログインできない状態にする関数
+def deactivate_user(user):
+    user.is_active = False
+    user.deleted_at = timezone.now()
+    user.save(update_fields=["is_active", "deleted_at"])
+    user_cache.invalidate(user.id)
+
+
+# クエリセットを関連行を読み込まずに少しずつ削除する関数
+def delete_in_batches(queryset, batch_size=DELETE_BATCH_SIZE):
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            batch = model.objects.filter(pk__in=ids)
+            deleted += batch._raw_delete(batch.db)
+
+
+# 退会ユーザーのお気に入り・トークン・ユーザー本体を削除する関数
+def purge_user(user_id):
+    try:
+        symbols = list(
+            StockSymbol.objects.filter(user_id=user_id).values_list("symbol", flat=True).distinct()
+        )
+
+        delete_in_batches(StockSymbol.objects.filter(user_id=user_id))
+        delete_in_batches(BlacklistedToken.objects.filter(token__user_id=user_id))
+        delete_in_batches(OutstandingToken.objects.filter(user_id=user_id))
+
+        # 残りの関連（グループ・権限・管理画面ログ）は件数が少ないので通常の削除に任せる
+        CustomUser.objects.filter(id=user_id, deleted_at__isnull=False).delete()
+        user_cache.invalidate(user_id)
+
+        # 誰もお気に入りにしていない銘柄は共有キャッシュから外す
+        release_symbols(symbols)
+    finally:
+        connection.close()
+
+
+def schedule_purge(user_id):
+    return _deletion_executor.submit(purge_user, user_id)
@@ -0,0 +1,98 @@
+# accounts/hashing.py
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from stockmanager.profiling import record_password_hashing
+
+logger = logging.getLogger(__name__)
+
+HASHING_CONCURRENCY = getattr(settings, "PASSWORD_HASHING_CONCURRENCY", 2)  # 同時にハッシュ計算する数
+HASHING_QUEUE_SIZE = getattr(settings, "PASSWORD_HASHING_QUEUE_SIZE", 8)  # 順番待ちできる数
+SLOW_QUEUE_SECONDS = 0.5  # これ以上待たされたらログに残す
+
+
+# ハッシュ計算の順番待ちが溢れたときのエラー
+class PasswordHashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "混み合っています。しばらくしてから再度お試しください。"
+    default_code = "password_hashing_busy"
+
+
+# パスワードのハッシュ計算を専用スレッドで行い、同時実行数と順番待ちの数を制限するクラス
+class PasswordHashingPool:
+    def __init__(self, concurrency=HASHING_CONCURRENCY, queue_size=HASHING_QUEUE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="password-hashing")
+        self._slots = threading.BoundedSemaphore(concurrency + queue_size)
+        self._lock = threading.Lock()
+        self._stats = {"completed": 0, "rejected": 0, "queue_seconds": 0.0, "max_queue_seconds": 0.0, "hash_seconds": 0.0}
+
+    def run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["rejected"] += 1
+            logger.warning("password hashing queue is full (rejected=%d)", self._stats["rejected"])
+            raise PasswordHashingBusy()
+
+        submitted_at = time.monotonic()
+        timings = {}
+
+        def job():
+            started_at = time.monotonic()
+            try:
+                return func(*args)
+            finally:
+                timings["queue"], timings["hash"] = started_at - submitted_at, time.monotonic() - started_at
+                self._record(timings["queue"], timings["hash"])
+
+        try:
+            return self._executor.submit(job).result()
+        finally:
+            self._slots.release()
+            # リクエストの slow request ログに載せる（記録はリクエストのスレッドで行う）
+            if timings:
+                record_password_hashing(timings["queue"], timings["hash"])
+
+    def _record(self, queue_seconds, hash_seconds):
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_seconds"] += queue_seconds
+            self._stats["max_queue_seconds"] = max(self._stats["max_queue_seconds"], queue_seconds)
+            self._stats["hash_seconds"] += hash_seconds
+        if queue_seconds >= SLOW_QUEUE_SECONDS:
+            # 混み具合がわかるよう、プール全体の統計も残す
+            logger.warning(
+                "password hashing waited %.3fs in queue %s",
+                queue_seconds,
+                json.dumps(self.stats(), ensure_ascii=False),
+            )
+
+    # 処理件数・待ち時間などの統計を返す関数
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        completed = stats["completed"] or 1
+        stats["avg_queue_seconds"] = stats["queue_seconds"] / completed
+        stats["avg_hash_seconds"] = stats["hash_seconds"] / completed
+        return stats
+
+
+hashing_pool = PasswordHashingPool()
+
+
+def hash_password(raw_password):
+    return hashing_pool.run(make_password, raw_password)
+
+
+# パスワードを照合し、ハッシュ方式や強度が古ければ新しい設定でハッシュし直す関数
+def check_user_password(user, raw_password):
+    is_correct, must_update = hashing_pool.run(verify_password, raw_password, user.password)
+    if is_correct and must_update:
+        user.password = hash_password(raw_password)
+        user.save(update_fields=["password"])
+    return is_correct
@@ -0,0 +1,72 @@
+import time
+import uuid
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from accounts.models import CustomUser
+from accounts.tokens import CachedBlacklistRefreshToken, blacklist_cache
+
+
+# トークンテーブルの件数ごとに /api/token/refresh/ のスループットを計測するコマンド
+# 計測用のデータはトランザクションごとロールバックするので、実データは変更しない
+class Command(BaseCommand):
+    help = "トークンテーブルの件数を変えながら /api/token/refresh/ のスループットを計測します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+            help="事前に作成するトークン件数",
+        )
+        parser.add_argument("--requests", type=int, default=200, help="計測するリフレッシュ回数")
+
+    def handle(self, *args, **options):
+        self.stdout.write("tokens\trequests/s\tavg ms")
+        for size in options["sizes"]:
+            with transaction.atomic():
+                rate, avg_ms = self.measure(size, options["requests"])
+                transaction.set_rollback(True)
+            self.stdout.write(f"{size}\t{rate:.1f}\t{avg_ms:.2f}")
+
+    def measure(self, size, requests):
+        user = CustomUser.objects.create_user(
+            email=f"bench-{uuid.uuid4().hex}@example.com", username="bench"
+        )
+        self.seed_tokens(user, size)
+        blacklist_cache.clear()
+
+        client = Client(SERVER_NAME="localhost")
+        refresh = str(CachedBlacklistRefreshToken.for_user(user))
+
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.post(
+                "/api/token/refresh/", {"refresh": refresh}, content_type="application/json"
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"リフレッシュに失敗しました: {response.content!r}")
+            refresh = response.json()["refresh"]
+        elapsed = time.perf_counter() - started
+
+        return requests / elapsed, elapsed / requests * 1000
+
+    # 半分は期限切れ、半分はブラックリスト入りのトークンを作る
+    def seed_tokens(self, user, size, batch_size=5000):
+        now = timezone.now()
+        for start in range(0, size, batch_size):
+            count = min(batch_size, size - start)
+            tokens = OutstandingToken.objects.bulk_create(
+                OutstandingToken(
+                    user=user,
+                    jti=uuid.uuid4().hex,
+                    token="",
+                    created_at=now,
+                    expires_at=now + timedelta(days=7 if (start + i) % 2 else -1),
+                )
+                for i in range(count)
+            )
+            BlacklistedToken.objects.bulk_create(
+                BlacklistedToken(token=token) for token in tokens if token.expires_at > now
+            )
@@ -0,0 +1,42 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+# 期限切れのrefreshトークンを少しずつ削除するコマンド
+# flushexpiredtokens と違い、1回のDELETEを小さく保ってテーブルを長時間ロックしない
+class Command(BaseCommand):
+    help = "期限切れのトークン（OutstandingToken / BlacklistedToken）をバッチで削除します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="1回に削除する件数")
+        parser.add_argument("--pause", type=float, default=0.05, help="バッチ間の待ち時間（秒）")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        now = timezone.now()
+        deleted = 0
+
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=now)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            # 関連行を読み込まずに削除する（ブラックリスト → 発行済みトークンの順）
+            with transaction.atomic():
+                blacklisted = BlacklistedToken.objects.filter(token_id__in=ids)
+                blacklisted._raw_delete(blacklisted.db)
+                outstanding = OutstandingToken.objects.filter(id__in=ids)
+                deleted += outstanding._raw_delete(outstanding.db)
+
+            if len(ids) < batch_size:
+                break
+            time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ 期限切れトークンを {deleted} 件削除しました"))
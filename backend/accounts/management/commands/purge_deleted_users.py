@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from accounts.deletion import purge_user
+from accounts.models import CustomUser
+
+
+# 退会処理が途中で止まったユーザー（再起動などで削除が完了しなかったもの）を削除するコマンド
+class Command(BaseCommand):
+    help = "退会済みで関連データの削除が完了していないユーザーを削除します"
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            CustomUser.objects.filter(deleted_at__isnull=False).values_list("id", flat=True)
+        )
+        for user_id in user_ids:
+            purge_user(user_id)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(user_ids)} 件の退会ユーザーを削除しました"))
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+INDEX_NAME = "token_outstanding_expires_idx"
+
+
+# 期限切れトークンの削除（prune_tokens）で使う expires_at にインデックスを張る
+# PostgreSQL ではテーブルをロックしないよう CONCURRENTLY で作成する
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        sql = f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} ON token_blacklist_outstandingtoken (expires_at)"
+    elif vendor == "mysql":
+        sql = f"CREATE INDEX {INDEX_NAME} ON token_blacklist_outstandingtoken (expires_at)"
+    else:
+        sql = f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON token_blacklist_outstandingtoken (expires_at)"
+    schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        sql = f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}"
+    elif vendor == "mysql":
+        sql = f"DROP INDEX {INDEX_NAME} ON token_blacklist_outstandingtoken"
+    else:
+        sql = f"DROP INDEX IF EXISTS {INDEX_NAME}"
+    schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("accounts", "0001_initial"),
+        ("token_blacklist", "0012_alter_outstandingtoken_user"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
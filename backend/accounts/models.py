@@ -19,6 +19,7 @@ class CustomUserManager(UserManager):
 
 class CustomUser(AbstractUser):
     email = models.EmailField(unique=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)  # 退会処理中（関連データ削除待ち）
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
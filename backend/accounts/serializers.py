@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 from .models import CustomUser
+from .tokens import CachedBlacklistRefreshToken
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,3 +20,13 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             password=validated_data['password'],
         )
         return user
+
+
+# ログイン時に発行するリフレッシュトークンもブラックリスト確認をプロセス内キャッシュで行う
+class CachedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = CachedBlacklistRefreshToken
+
+
+# リフレッシュ時のブラックリスト確認をプロセス内キャッシュで行う
+class CachedTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = CachedBlacklistRefreshToken
@@ -0,0 +1,39 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+
+
+# ログインの slow request ログに、パスワードのハッシュ計算の統計が載ることを確かめる
+class PasswordHashingStatsLogTest(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(username="stats", email="stats@example.com", password="pw-123456")
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_login_logs_password_hashing_stats(self):
+        # ミドルウェアは最初のリクエストで設定を読むので、設定を変えてからクライアントを作る
+        client = Client()
+        with self.assertLogs("stockmanager.slow_requests", level="WARNING") as logs:
+            response = client.post(
+                "/api/token/",
+                {"email": "stats@example.com", "password": "pw-123456"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+        record = json.loads(logs.records[-1].getMessage())
+        hashing = record["password_hashing"]
+        self.assertEqual(len(hashing["calls"]), 1)
+        self.assertGreater(hashing["calls"][0]["hash_ms"], 0)
+        self.assertGreaterEqual(hashing["pool"]["completed"], 1)
+        for key in ("rejected", "avg_queue_seconds", "max_queue_seconds", "avg_hash_seconds"):
+            self.assertIn(key, hashing["pool"])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD_MS=0)
+    def test_requests_without_hashing_omit_stats(self):
+        client = Client()
+        with self.assertLogs("stockmanager.slow_requests", level="WARNING") as logs:
+            client.post("/api/token/refresh/", {"refresh": "invalid"}, content_type="application/json")
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertNotIn("password_hashing", record)
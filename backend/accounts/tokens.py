@@ -0,0 +1,85 @@
+# accounts/tokens.py
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+# 他プロセスで無効化されたトークンを取り込む間隔（秒）
+BLACKLIST_REFRESH_INTERVAL = getattr(settings, "TOKEN_BLACKLIST_REFRESH_INTERVAL", 5)
+# 取り込み時に前回より遡って読み直す秒数
+# id 順にコミットされるとは限らない（Postgres）ので、前回の取り込み前後に追加された行も拾い直す
+BLACKLIST_RESCAN_WINDOW = 60
+
+
+# 無効化済みトークンの jti をプロセス内に保持し、直近に追加された分をDBから取り込むクラス
+class BlacklistCache:
+    def __init__(self, refresh_interval=BLACKLIST_REFRESH_INTERVAL, rescan_window=BLACKLIST_RESCAN_WINDOW):
+        self.refresh_interval = refresh_interval
+        self.rescan_window = timedelta(seconds=rescan_window)
+        self._expires = {}  # jti -> 有効期限（epoch秒）
+        self._scanned_at = None  # 前回の取り込みを始めた時刻
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        started_at = timezone.now()
+        if self._scanned_at is None:
+            # 初回は期限切れでないトークンをすべて読み込む
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=started_at)
+        else:
+            rows = BlacklistedToken.objects.filter(
+                blacklisted_at__gte=self._scanned_at - self.rescan_window
+            )
+
+        for jti, expires_at in rows.values_list("token__jti", "token__expires_at"):
+            self._expires[jti] = expires_at.timestamp()
+
+        # 期限切れのトークンはどのみち検証で弾かれるので捨てる
+        now = time.time()
+        self._expires = {jti: exp for jti, exp in self._expires.items() if exp > now}
+        self._scanned_at = started_at
+        self._refreshed_at = time.monotonic()
+
+    def contains(self, jti):
+        with self._lock:
+            if (
+                self._refreshed_at is None
+                or time.monotonic() - self._refreshed_at >= self.refresh_interval
+            ):
+                self._refresh()
+            return jti in self._expires
+
+    def clear(self):
+        with self._lock:
+            self._expires = {}
+            self._scanned_at = None
+            self._refreshed_at = None
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._expires[jti] = exp
+
+
+blacklist_cache = BlacklistCache()
+
+
+# ブラックリスト確認をプロセス内のキャッシュで行うリフレッシュトークン
+class CachedBlacklistRefreshToken(RefreshToken):
+    def check_blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        if blacklist_cache.contains(jti):
+            raise TokenError("Token is blacklisted")
+
+    # プロセス内のキャッシュに載る前に別のワーカーで使われた（ローテーション・ログアウト済みの）
+    # トークンは、DBに登録済みかどうかで弾く
+    def blacklist(self):
+        blacklisted, created = super().blacklist()
+        blacklist_cache.add(self.payload[api_settings.JTI_CLAIM], self.payload["exp"])
+        if not created:
+            raise TokenError("Token is blacklisted")
+        return blacklisted, created
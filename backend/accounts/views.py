@@ -1,16 +1,20 @@
 # accounts/views.py
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework_simplejwt.views import TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView, TokenObtainPairView
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from rest_framework import status, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.authentication import JWTAuthentication
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from .models import CustomUser
+from .authentication import CachedJWTAuthentication
+from .tokens import CachedBlacklistRefreshToken
+from .deletion import deactivate_user, schedule_purge
+from .hashing import hash_password
+from stockmanager.controller import prefetch_watchlist
 
 
 User = get_user_model()
@@ -27,18 +31,41 @@ class RegisterView(APIView):
         if not email or not password:
             return Response({"error": "メールとパスワードは必須です"}, status=400)
 
+        # 重いハッシュ計算の前に、登録済みのメールアドレスは弾いておく
         if User.objects.filter(email=email).exists():
             return Response({"error": "このメールアドレスは既に登録されています"}, status=400)
 
-        user = User.objects.create(
-            email=email,
-            username=username,
-            password=make_password(password)
-        )
+        password = hash_password(password)  # ハッシュ計算は専用スレッドで行う
+
+        # 同時登録・ユーザー名の重複は一意制約の違反で判定する
+        try:
+            with transaction.atomic():
+                User.objects.create(email=email, username=username, password=password)
+        except IntegrityError:
+            if User.objects.filter(email=email).exists():
+                return Response({"error": "このメールアドレスは既に登録されています"}, status=400)
+            return Response({"error": "このユーザー名は既に使われています"}, status=400)
         return Response({"message": "登録成功！"}, status=status.HTTP_201_CREATED)
     
 
    
+# ログイン（JWT発行と同時にお気に入り銘柄の事前取得を開始）
+class LoginView(TokenObtainPairView):
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+
+        # ダッシュボード表示までにキャッシュを温めておく
+        prefetch_watchlist(serializer.user.id)
+
+        return Response(serializer.validated_data, status=status.HTTP_200_OK)
+
+
 # ログアウト
 class LogoutView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -49,7 +76,7 @@ class LogoutView(APIView):
             if not refresh_token:
                 return Response({"error": "refreshトークンが必要です"}, status=status.HTTP_400_BAD_REQUEST)
 
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()  # ← blacklistに登録して無効化
 
             return Response({"message": "ログアウトしました（トークン無効化）"}, status=status.HTTP_205_RESET_CONTENT)
@@ -59,7 +86,7 @@ class LogoutView(APIView):
 
 # ログインユーザーの確認
 class CurrentUserView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
@@ -71,10 +98,14 @@ class CurrentUserView(APIView):
 
 # アカウント削除
 class DeleteUserView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def delete(self, request):
         user = request.user
-        user.delete()
-        return Response({"message": "アカウントを削除しました"}, status=status.HTTP_200_OK)
\ No newline at end of file
+
+        # すぐにアカウントを無効化し、関連データの削除はバックグラウンドで行う
+        deactivate_user(user)
+        schedule_purge(user.id)
+
+        return Response({"message": "アカウントを削除しました"}, status=status.HTTP_200_OK)
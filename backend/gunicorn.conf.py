@@ -0,0 +1,30 @@
+# gunicorn の設定（render.yaml の startCommand から -c で読み込む）
+import gc
+import os
+
+# マスタープロセスでアプリを読み込んでから fork し、読み取り専用のデータをワーカー間で共有する
+preload_app = True
+
+# 1ワーカーで複数のリクエストを並行して処理する
+# パスワードのハッシュ計算（accounts/hashing.py）を待つ間も、同じワーカーで一覧などを返せるようにする
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+
+# ワーカーを起動する直前にマスタープロセスで一度だけ呼ばれる
+def when_ready(server):
+    from django.db import connections
+    from stockmanager.symbol_index import load_symbol_index
+
+    try:
+        index = load_symbol_index()
+        server.log.info("symbol index loaded: %d symbols", len(index))
+    except Exception:
+        # 作れなかった場合は各ワーカーが初回検索時に作る
+        server.log.exception("failed to build symbol index")
+
+    # DB接続はワーカー間で共有できないので fork 前に閉じる
+    connections.close_all()
+
+    # 以降に作られたオブジェクトだけをGCの対象にし、共有ページへの書き込み（コピー）を防ぐ
+    gc.freeze()
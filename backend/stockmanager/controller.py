@@ -1,47 +1,381 @@
+import hashlib
+import logging
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from django.conf import settings
 from django.core.cache import cache
-from .services.chatgpt import ChatGPT
-from .services.yahoofinance import CompanyFinancialsFetcher
+from django.db.models import Count
+from .services import get_service
+from .snapshot import NUMERIC_FIELDS, checked_at, get_snapshot, row_to_metrics
+from .models import StockSymbol
+from .peers import update_peer_stats, remove_from_peer_stats
+from .profiling import record_symbol
 from .utils import convert_symbol
 
+logger = logging.getLogger(__name__)
+
 CACHE_TIMEOUT = 60 * 60  # 1時間
+SNAPSHOT_MAX_STALE = 60 * 60 * 24 * 7  # 確認から1時間を過ぎたスナップショットの行を、裏で取り直しながら返す期間（7日）
+REVALIDATE_LOCK_TIMEOUT = 60 * 5  # 同じ銘柄の取り直しを重複して始めない期間
+REVALIDATE_BATCH_DELAY = 5  # 取り直す銘柄を溜めてからスナップショットを書き直すまでの秒数
+BASELINE_TIMEOUT = 60 * 60 * 24 * 30  # 差分の判定に使う前回の指標・入力を残す期間（30日）
+WARMUP_SYMBOL_LIMIT = 50  # デプロイ時に事前取得する銘柄数
+FETCH_CONCURRENCY = 8  # 一覧画面で同時に取得する銘柄数
+
+SYMBOL_LOOKUP_TIMEOUT = 60 * 60 * 24 * 30  # ChatGPTで調べた企業名→シンボルを覚えておく期間（30日）
+RESOLVE_CHUNK_SIZE = 25  # 一括変換で1回の問い合わせにまとめる企業名の数
+RESOLVE_CONCURRENCY = 4  # 一括変換で同時に行う問い合わせの数
+
+# ログイン時の事前取得をリクエスト外で処理するためのワーカー
+_prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prefetch")
+
+# スナップショットの取り直し待ちの銘柄
+_revalidate_pending = set()
+_revalidate_lock = threading.Lock()
+
+
+# 銘柄ごとのキャッシュキーを作る関数（ユーザー間で共有する）
+def metrics_cache_key(symbol, include_overview=False):
+    return f"metrics_{symbol}_{'detail' if include_overview else 'list'}"
+
+
+# キャッシュ中の指標がいつ取得されたか（ETag / Last-Modified に使う）を保存するキー
+def metrics_version_key(symbol, include_overview=False):
+    return f"{metrics_cache_key(symbol, include_overview)}_version"
+
+
+# 前回の指標・計算に使った入力（財務データの各項目の値）・取得時刻を保存するキー
+# 指標のキャッシュが切れた後の再取得でも差分を判定できるよう、指標より長く残す
+def metrics_baseline_key(symbol, include_overview=False):
+    return f"{metrics_cache_key(symbol, include_overview)}_baseline"
+
+
+# 変わったときに業種集計を更新する必要がある項目
+PEER_INPUTS = {key for _, key in NUMERIC_FIELDS} | {"sector", "industry"}
+
+
+# 一覧用・詳細用それぞれの「項目 → 入力」の依存関係
+def metric_graph(include_overview=False):
+    from .services.yahoofinance import CLASSIFICATION_INPUTS, METRIC_INPUTS, OVERVIEW_INPUTS
+
+    graph = {**METRIC_INPUTS, **CLASSIFICATION_INPUTS}
+    if include_overview:
+        graph.update(OVERVIEW_INPUTS)
+    return graph
+
+
+# 指定した銘柄のキャッシュ取得時刻をまとめて返す関数（キャッシュにない銘柄は None）
+def get_metrics_versions(symbols, include_overview=False):
+    keys = {
+        metrics_version_key(convert_symbol(symbol), include_overview): symbol
+        for symbol in symbols
+    }
+    versions = cache.get_many(list(keys))
+    result = {symbol: versions.get(key) for key, symbol in keys.items()}
+
+    # 一覧用の指標はキャッシュになければスナップショットの取得時刻を使う
+    # 古い行（再検証待ち）の取得時刻で 304 を返さないよう、CACHE_TIMEOUT 以内に確認した行に限る
+    if not include_overview:
+        missing = {
+            str(convert_symbol(symbol)): symbol
+            for symbol, version in result.items()
+            if version is None
+        }
+        for row in get_snapshot().get_rows(list(missing), CACHE_TIMEOUT):
+            result[missing[str(row["symbol"])]] = float(row["fetched_at"])
+    return result
+
+
+# 企業名ごとのChatGPTの回答を保存するキー（表記ゆれは同じキーにまとめる）
+def symbol_lookup_key(company_name):
+    from .symbol_index import normalize_name
+
+    digest = hashlib.sha1(normalize_name(company_name).encode()).hexdigest()
+    return f"symbol_lookup_{digest}"
+
+
+def is_invalid_symbol(symbol):
+    return str(symbol).lower() == "invalid"
+
 
 # 検索から銘柄を表示する関数（会社名→シンボル）
 def search_symbol(company_name, request):
-    symbol_fetcher = ChatGPT()
-    symbol = symbol_fetcher.getSymbol(company_name)
-    if symbol == "Invalid" or symbol == "INVALID" or symbol == "invalid":
+    from .symbol_index import get_symbol_index
+
+    # 既知の企業名・シンボルならChatGPTに問い合わせない
+    symbol = get_symbol_index().lookup(company_name)
+    if symbol:
+        return symbol
+
+    # 以前に調べた企業名なら回答を使い回す
+    cache_key = symbol_lookup_key(company_name)
+    symbol = cache.get(cache_key)
+    if symbol is None:
+        symbol_fetcher = get_service("chatgpt")()
+        symbol = symbol_fetcher.getSymbol(company_name)
+        cache.set(cache_key, symbol, SYMBOL_LOOKUP_TIMEOUT)
+
+    if is_invalid_symbol(symbol):
         raise ValueError("企業名が正しくありません。")
     return symbol
 
 
+def _resolve_chunk(symbol_fetcher, company_names):
+    from .symbol_index import normalize_name
+
+    try:
+        answers = symbol_fetcher.getSymbols(company_names)
+    except Exception:
+        logger.exception("❌ 企業名の一括変換に失敗しました（%d 件）", len(company_names))
+        return {}
+    # 回答のキーが入力と少し違っても（全角・半角など）対応づける
+    normalized = {normalize_name(name): symbol for name, symbol in answers.items()}
+    return {
+        name: answers.get(name) or normalized.get(normalize_name(name))
+        for name in company_names
+        if answers.get(name) or normalized.get(normalize_name(name))
+    }
+
+
+# 複数の企業名をまとめてシンボルに変換する関数（ポートフォリオの取り込み用）
+# 銘柄一覧 → 以前の回答 → ChatGPT（複数件ずつ JSON で問い合わせ）の順に調べる
+def resolve_symbols(company_names):
+    from .symbol_index import get_symbol_index
+
+    names = list(dict.fromkeys(str(name).strip() for name in company_names if str(name).strip()))
+    results = {}  # 企業名 -> (シンボル, どこで見つかったか)
+
+    index = get_symbol_index()
+    for name in names:
+        symbol = index.lookup(name)
+        if symbol:
+            results[name] = (symbol, "index")
+
+    keys = {symbol_lookup_key(name): name for name in names if name not in results}
+    for key, symbol in cache.get_many(list(keys)).items():
+        results[keys[key]] = (symbol, "cache")
+
+    remaining = [name for name in names if name not in results]
+    chunks = [
+        remaining[i:i + RESOLVE_CHUNK_SIZE] for i in range(0, len(remaining), RESOLVE_CHUNK_SIZE)
+    ]
+    if chunks:
+        symbol_fetcher = get_service("chatgpt")()
+        with ThreadPoolExecutor(
+            max_workers=min(RESOLVE_CONCURRENCY, len(chunks)), thread_name_prefix="resolve"
+        ) as executor:
+            for answers in executor.map(lambda chunk: _resolve_chunk(symbol_fetcher, chunk), chunks):
+                for name, symbol in answers.items():
+                    results[name] = (symbol, "chatgpt")
+                # 回答が得られたものだけ覚えておく（失敗・回答漏れは次回また問い合わせる）
+                cache.set_many(
+                    {symbol_lookup_key(name): symbol for name, symbol in answers.items()},
+                    SYMBOL_LOOKUP_TIMEOUT,
+                )
+
+    resolved = []
+    for name in names:
+        symbol, source = results.get(name, (None, "unresolved"))
+        if symbol is not None and is_invalid_symbol(symbol):
+            symbol = None
+        resolved.append({"company_name": name, "symbol": symbol, "source": source})
+    return resolved
+
+
 # 銘柄を表示させる関数(条件分岐で一覧画面・詳細画面で使い分ける)
-def fetch_company_data(symbol, request, include_overview=False):
+def fetch_company_data(symbol, request=None, include_overview=False, force_refresh=False):
+    started_at = time.monotonic()
     symbol = convert_symbol(symbol)
-    cache_key = f"metrics_{request.user.id}_{symbol}_{'detail' if include_overview else 'list'}"
-    cached_data = cache.get(cache_key)
+    cache_key = metrics_cache_key(symbol, include_overview)
+    cached_data = None if force_refresh else cache.get(cache_key)
 
     if cached_data:
+        record_symbol(symbol, "cache", started_at)
         return cached_data
-    else:
-        time.sleep(3)
+
+    # 一覧用の指標は全ワーカー共有のスナップショット（mmap）にあればそれを使う
+    # 確認から時間が経った行もそのまま返し、裏で取り直す（再起動が長引いてもスナップショットを使える）
+    if not include_overview and not force_refresh:
+        row = get_snapshot().get_row(symbol, max_age=SNAPSHOT_MAX_STALE)
+        if row is not None:
+            if time.time() - float(checked_at(row)) > CACHE_TIMEOUT:
+                revalidate_snapshot(symbol)
+            record_symbol(symbol, "snapshot", started_at)
+            return row_to_metrics(row)
+
+    time.sleep(settings.UPSTREAM_FETCH_DELAY)
+
+    # 前回の指標と入力があれば、入力が変わった指標だけを計算し直す
+    baseline_key = metrics_baseline_key(symbol, include_overview)
+    baseline = cache.get(baseline_key)
 
     try:
-        fetcher = CompanyFinancialsFetcher(symbol)
+        from .services.yahoofinance import METRIC_INPUTS, changed_metrics
+
+        fetcher = get_service("financials")(symbol)
         fetcher.getCompanyFinancials()
-        metrics = fetcher.get_all_metrics()
+        graph = metric_graph(include_overview)
+        inputs = fetcher.get_input_fingerprint(graph)
+
+        if baseline:
+            previous_metrics, previous_inputs, previous_version = baseline
+            changed = changed_metrics(previous_inputs, inputs, graph)
+            metrics = {
+                **previous_metrics,
+                **fetcher.get_metrics([name for name in changed if name in METRIC_INPUTS]),
+            }
+        else:
+            changed = list(graph)
+            metrics = fetcher.get_all_metrics()
+        classification = fetcher.get_classification()
 
-        # 詳細画面で銘柄の追加情報を表示させる
-        if include_overview:
+        # 詳細画面で銘柄の追加情報を表示させる（概要の翻訳は元の文章が変わったときだけ）
+        if include_overview and {"WEBサイト", "企業概要"} & set(changed):
             overview = fetcher.get_company_overview()
             metrics["WEBサイト"] = overview.get("WEBサイト", "N/A")
             metrics["企業概要"] = overview.get("企業概要", "N/A")
 
-    except Exception as e:
-        import traceback
-        print("❌ エラー発生:", str(e))
-        traceback.print_exc()
+    except Exception:
+        record_symbol(symbol, "error", started_at)
+        logger.exception("❌ %s の財務データ取得に失敗しました", symbol)
         raise
 
-    cache.set(cache_key, metrics, CACHE_TIMEOUT)
+    # 入力が変わっていなければ取得時刻（ETag / Last-Modified）は前回のままにする
+    version = previous_version if baseline and not changed else time.time()
+    cache.set_many(
+        {cache_key: metrics, metrics_version_key(symbol, include_overview): version},
+        CACHE_TIMEOUT,
+    )
+    cache.set(baseline_key, (metrics, inputs, version), BASELINE_TIMEOUT)
+
+    record_symbol(symbol, "upstream", started_at)
+
+    # セクター・業種の集計は付加情報なので、失敗しても指標は返す
+    if PEER_INPUTS & set(changed):
+        try:
+            update_peer_stats(symbol, classification, metrics)
+        except Exception:
+            logger.exception("⚠️ %s の業種集計の更新に失敗しました", symbol)
     return metrics
+
+
+# スナップショットの古い行をバックグラウンドで取り直す関数（同じ銘柄は重複して取り直さない）
+# ファイルの書き直しは銘柄数に比例するので、REVALIDATE_BATCH_DELAY の間に溜まった銘柄をまとめて書き直す
+def revalidate_snapshot(symbol):
+    if not cache.add(f"{metrics_cache_key(symbol)}_revalidating", True, REVALIDATE_LOCK_TIMEOUT):
+        return
+    with _revalidate_lock:
+        schedule = not _revalidate_pending
+        _revalidate_pending.add(symbol)
+    if schedule:
+        timer = threading.Timer(REVALIDATE_BATCH_DELAY, _prefetch_executor.submit, (_flush_revalidations,))
+        timer.daemon = True
+        timer.start()
+
+
+# 溜まった取り直し待ちの銘柄をまとめて取り直し、スナップショットを1回で書き直す関数
+def _flush_revalidations():
+    with _revalidate_lock:
+        symbols = list(_revalidate_pending)
+        _revalidate_pending.clear()
+    if symbols:
+        warm_cache(symbols, refresh=True)
+
+
+# 複数銘柄を並列に取得し、取得できた順に (symbol, metrics, error) を返す関数
+def iter_company_data(symbols, request=None, include_overview=False):
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, min(FETCH_CONCURRENCY, len(symbols))),
+        thread_name_prefix="fetch",
+    )
+    try:
+        # リクエストの記録（profiling）がワーカースレッドからも見えるようにコンテキストを引き継ぐ
+        futures = {
+            executor.submit(
+                copy_context().run, fetch_company_data, symbol, request, include_overview
+            ): symbol
+            for symbol in symbols
+        }
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                yield symbol, future.result(), None
+            except Exception as e:
+                yield symbol, None, e
+    finally:
+        # クライアント切断時などは未着手の取得を破棄する
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 複数銘柄をキャッシュに読み込み、スナップショットに書き出す関数
+# refresh=False なら取得済みの銘柄はスキップされる
+def warm_cache(symbols, refresh=False):
+    warmed, failed = {}, []
+    for symbol in symbols:
+        try:
+            warmed[symbol] = fetch_company_data(
+                symbol, include_overview=False, force_refresh=refresh
+            )
+        except Exception:
+            failed.append(symbol)
+
+    if warmed:
+        # 取得時刻はキャッシュと同じ（変わっていなければ前回の）値にし、ETag がずれないようにする
+        # 取り直した銘柄は指標が変わっていなくても今確認したので、確認時刻だけ新しくする
+        versions = get_metrics_versions(list(warmed))
+        now = time.time()
+        get_snapshot().write(
+            {
+                convert_symbol(symbol): (
+                    metrics,
+                    versions[symbol] or now,
+                    now if refresh else versions[symbol] or now,
+                )
+                for symbol, metrics in warmed.items()
+            }
+        )
+    return list(warmed), failed
+
+
+# お気に入り登録数の多い銘柄を取得する関数
+def most_watched_symbols(limit=WARMUP_SYMBOL_LIMIT):
+    return list(
+        StockSymbol.objects.values("symbol")
+        .annotate(watchers=Count("user"))
+        .order_by("-watchers", "symbol")
+        .values_list("symbol", flat=True)[:limit]
+    )
+
+
+# お気に入り登録者がいなくなった銘柄を共有キャッシュから削除する関数
+def release_symbols(symbols):
+    watched = set(
+        StockSymbol.objects.filter(symbol__in=symbols).values_list("symbol", flat=True)
+    )
+    released = [symbol for symbol in symbols if symbol not in watched]
+    keys = []
+    for symbol in released:
+        symbol = convert_symbol(symbol)
+        for include_overview in (False, True):
+            keys.append(metrics_cache_key(symbol, include_overview))
+            keys.append(metrics_version_key(symbol, include_overview))
+            keys.append(metrics_baseline_key(symbol, include_overview))
+    cache.delete_many(keys)
+    for symbol in released:
+        remove_from_peer_stats(symbol)
+    return released
+
+
+# ユーザーのお気に入り銘柄をバックグラウンドで事前取得する関数
+def prefetch_watchlist(user_id):
+    symbols = list(
+        StockSymbol.objects.filter(user_id=user_id).values_list("symbol", flat=True)
+    )
+    keys = {metrics_cache_key(convert_symbol(symbol)): symbol for symbol in symbols}
+    cached = cache.get_many(list(keys))
+    missing = [symbol for key, symbol in keys.items() if key not in cached]
+    if missing:
+        _prefetch_executor.submit(warm_cache, missing)
+    return missing
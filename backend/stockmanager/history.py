@@ -0,0 +1,254 @@
+import datetime
+import os
+import re
+import tempfile
+import time
+from django.conf import settings
+from django.core.cache import cache
+from .services import get_service
+from .utils import convert_symbol
+
+HISTORY_RANGES = {"1m": 1, "3m": 3, "6m": 6, "1y": 12, "5y": 60, "10y": 120}  # 期間 → 月数
+DEFAULT_HISTORY_RANGE = "1y"
+DEFAULT_HISTORY_POINTS = 200
+MAX_HISTORY_POINTS = 2000
+HISTORY_METHODS = ("lttb", "minmax")
+OPEN_MONTH_TIMEOUT = 60 * 15  # 確定していない月のブロックをキャッシュする秒数
+EMPTY_MONTH_RETRY = 60 * 60 * 24  # 日足が1件もなかった確定月を、上流に問い合わせ直すまでの秒数
+# 英数字を1文字以上含む（"." や ".." のようにディレクトリを指す名前を通さない）
+SYMBOL_PATTERN = re.compile(r"(?=.*[A-Za-z0-9])[A-Za-z0-9.\-^=]{1,10}")
+
+
+def history_dtype():
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("date", "M8[D]"),
+            ("open", "f8"),
+            ("high", "f8"),
+            ("low", "f8"),
+            ("close", "f8"),
+            ("volume", "f8"),
+        ]
+    )
+
+
+# day の月初から n か月ずらした月初を返す関数
+def add_months(day, n):
+    years, month = divmod(day.month - 1 + n, 12)
+    return datetime.date(day.year + years, month + 1, 1)
+
+
+# 日足を銘柄・月ごとのブロック（NumPy 配列のファイル）で保存するクラス
+# 確定した月のブロックは書き換えないので、一度取得すれば上流に問い合わせない
+class PriceHistoryStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def block_path(self, symbol, month, suffix=".npy"):
+        root = os.path.realpath(self.directory)
+        path = os.path.realpath(os.path.join(root, str(symbol), f"{month:%Y-%m}{suffix}"))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError("symbolが正しくありません")
+        return path
+
+    # 日足が1件もなかった月の目印（上場前・上場廃止後など）
+    # 上流の一時的な失敗と区別できないので、EMPTY_MONTH_RETRY を過ぎたら問い合わせ直す
+    def empty_marker_path(self, symbol, month):
+        return self.block_path(symbol, month, suffix=".empty")
+
+    def _is_known_empty(self, symbol, month):
+        try:
+            checked_at = os.path.getmtime(self.empty_marker_path(symbol, month))
+        except OSError:
+            return False
+        return time.time() - checked_at < EMPTY_MONTH_RETRY
+
+    def _mark_empty(self, symbol, month):
+        path = self.empty_marker_path(symbol, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w"):
+            pass
+
+    def _save_block(self, path, block):
+        import numpy as np
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, block, allow_pickle=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    # 上流から start 以上 end 未満の日足を取得する関数
+    def _fetch(self, symbol, start, end):
+        import numpy as np
+
+        columns = get_service("history")(symbol).get_history(start, end)
+        block = np.zeros(len(columns[0]), dtype=history_dtype())
+        for name, values in zip(block.dtype.names, columns):
+            block[name] = values
+        return block
+
+    def _split(self, block, months):
+        import numpy as np
+
+        return {
+            month: block[
+                (block["date"] >= np.datetime64(month))
+                & (block["date"] < np.datetime64(add_months(month, 1)))
+            ]
+            for month in months
+        }
+
+    # start 以降の日足を返す関数（確定した月はディスク、未確定の月はキャッシュから読む）
+    def load(self, symbol, start, today=None):
+        import numpy as np
+
+        symbol = convert_symbol(symbol)
+        if not SYMBOL_PATTERN.fullmatch(str(symbol)):
+            raise ValueError("symbolが正しくありません")
+
+        today = today or datetime.date.today()
+        months = []
+        month = add_months(start, 0)
+        while month <= today:
+            months.append(month)
+            month = add_months(month, 1)
+
+        # 前日までに終わった月を確定とみなす（月初は前月の最終営業日がまだ更新されうる）
+        settled = today - datetime.timedelta(days=1)
+        closed = [month for month in months if add_months(month, 1) <= settled]
+        open_months = [month for month in months if month not in closed]
+
+        blocks = {}
+        missing = []
+        for month in closed:
+            path = self.block_path(symbol, month)
+            if os.path.exists(path):
+                blocks[month] = np.load(path, allow_pickle=False)
+            elif self._is_known_empty(symbol, month):
+                blocks[month] = np.zeros(0, dtype=history_dtype())
+            else:
+                missing.append(month)
+
+        if missing:
+            fetched = self._fetch(symbol, missing[0], add_months(missing[-1], 1))
+            for month, block in self._split(fetched, missing).items():
+                # 1件も取れなかった場合（上流の失敗など）は確定させず、目印だけ残して当面は問い合わせない
+                if len(fetched):
+                    self._save_block(self.block_path(symbol, month), block)
+                else:
+                    self._mark_empty(symbol, month)
+                blocks[month] = block
+
+        if open_months:
+            cache_key = f"history_{symbol}_{open_months[0]:%Y-%m}"
+            block = cache.get(cache_key)
+            if block is None:
+                block = self._fetch(symbol, open_months[0], today + datetime.timedelta(days=1))
+                cache.set(cache_key, block, OPEN_MONTH_TIMEOUT)
+            blocks.update(self._split(block, open_months))
+
+        history = np.concatenate([blocks[month] for month in months])
+        if not len(history):
+            raise ValueError(f"{symbol} の株価履歴を取得できませんでした")
+        return history[history["date"] >= np.datetime64(start)]
+
+
+# Largest-Triangle-Three-Buckets で形を保ったまま threshold 点に間引く関数（残す添字を返す）
+def lttb(x, y, threshold):
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # 先頭・末尾を除いた点を threshold - 2 個のバケツに分け、各バケツから1点ずつ選ぶ
+    bucket_size = (n - 2) / (threshold - 2)
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        # 次のバケツの平均点（最後のバケツでは末尾の点）
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # 前に選んだ点・次のバケツの平均点と作る三角形の面積が最大の点を残す
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(area.argmax())
+        selected[i + 1] = previous
+    return selected
+
+
+# バケツごとに最小値・最大値の2点を残して間引く関数（残す添字を返す）
+def minmax(y, threshold):
+    import numpy as np
+
+    n = len(y)
+    buckets = threshold // 2
+    if threshold >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    selected = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if start == end:
+            continue
+        segment = y[start:end]
+        selected.extend(sorted({start + int(segment.argmin()), start + int(segment.argmax())}))
+    return np.array(selected, dtype=int)
+
+
+# 終値の系列を points 点に間引いて返す関数
+def downsample(history, points, method="lttb"):
+    import numpy as np
+
+    close = history["close"]
+    valid = np.isfinite(close)
+    history, close = history[valid], close[valid]
+    if method == "minmax":
+        selected = minmax(close, points)
+    else:
+        x = history["date"].astype("i8").astype("f8")
+        selected = lttb(x, close, points)
+
+    return {
+        "date": [str(date) for date in history["date"][selected]],
+        "close": [round(float(value), 2) for value in close[selected]],
+    }
+
+
+_store = None
+
+
+def get_history_store():
+    global _store
+    if _store is None:
+        _store = PriceHistoryStore(settings.PRICE_HISTORY_DIR)
+    return _store
+
+
+# 期間と点数を指定して株価チャート用の系列を返す関数
+def price_history(symbol, period=DEFAULT_HISTORY_RANGE, points=DEFAULT_HISTORY_POINTS, method="lttb"):
+    today = datetime.date.today()
+    start = add_months(today, -HISTORY_RANGES[period]).replace(day=min(today.day, 28))
+    history = get_history_store().load(symbol, start, today)
+    return {
+        "symbol": symbol,
+        "range": period,
+        "method": method,
+        "source_points": int(len(history)),
+        "series": downsample(history, points, method),
+    }
@@ -0,0 +1,39 @@
+import datetime
+import pandas as pd
+import requests
+from django.conf import settings
+from stockmanager.services.yahoofinance import CompanyFinancialsFetcher, PriceHistoryFetcher
+
+UPSTREAM_TIMEOUT = 30  # スタンドインへのリクエストのタイムアウト（秒）
+
+_session = requests.Session()
+
+
+def get_json(path, params=None):
+    response = _session.get(
+        f"{settings.LOADTEST_UPSTREAM_URL.rstrip('/')}/{path}", params=params, timeout=UPSTREAM_TIMEOUT
+    )
+    response.raise_for_status()  # 429 などは yfinance の失敗と同じく例外にする
+    return response.json()
+
+
+# yfinance の代わりにスタンドインから財務データを取得するクラス
+# 取得以外（各指標の計算・get_all_metrics）は本番と同じ処理を通る
+class StandInFinancialsFetcher(CompanyFinancialsFetcher):
+    def getCompanyFinancials(self):
+        payload = get_json(f"financials/{self.symbol}")
+        self.company_info = payload["info"]
+        # 最新期だけを持つ1列の DataFrame（df.loc[key].iloc[0] で読める形）
+        self.company_bs = pd.DataFrame({"latest": payload["balance_sheet"]})
+        self.company_pl = pd.DataFrame({"latest": payload["financials"]})
+        return self.company_info, self.company_bs, self.company_pl
+
+
+# yfinance の代わりにスタンドインから日足を取得するクラス
+class StandInHistoryFetcher(PriceHistoryFetcher):
+    def get_history(self, start, end):
+        columns = get_json(
+            f"history/{self.symbol}", {"start": start.isoformat(), "end": end.isoformat()}
+        )
+        columns[0] = [datetime.date.fromisoformat(day) for day in columns[0]]
+        return columns
@@ -0,0 +1,128 @@
+import math
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+import requests
+from .standins import STANDIN_COMPANIES
+
+LOADTEST_EMAIL_PREFIX = "loadtest-"  # 負荷試験で登録するユーザーのメールアドレス
+LOADTEST_PASSWORD = "loadtest-password"
+REQUEST_TIMEOUT = 120
+
+
+# エンドポイントごとのレイテンシとステータスを集めるクラス
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)  # エンドポイント -> [ミリ秒]
+        self.statuses = defaultdict(lambda: defaultdict(int))  # エンドポイント -> {status: 件数}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, milliseconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(milliseconds)
+            self.statuses[endpoint][status] += 1
+
+    # エンドポイントごとの件数・RPS・パーセンタイルを返す関数
+    def summary(self, elapsed):
+        rows = []
+        for endpoint in sorted(self.latencies):
+            latencies = sorted(self.latencies[endpoint])
+            statuses = self.statuses[endpoint]
+            rows.append(
+                {
+                    "endpoint": endpoint,
+                    "count": len(latencies),
+                    "rps": len(latencies) / elapsed if elapsed else 0.0,
+                    "p50": percentile(latencies, 50),
+                    "p90": percentile(latencies, 90),
+                    "p99": percentile(latencies, 99),
+                    "max": latencies[-1],
+                    "errors": sum(count for status, count in statuses.items() if status >= 400),
+                    "statuses": dict(statuses),
+                }
+            )
+        return rows
+
+
+# ソート済みの値から p パーセンタイルを求める関数（最近順位法）
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+# 1人分の利用の流れ（登録 → トークン取得 → 検索 → 詳細 → お気に入り登録 → 一覧）を再現するクラス
+class UserJourney:
+    def __init__(self, base_url, stats, rng=None):
+        self.base_url = base_url.rstrip("/")
+        self.stats = stats
+        self.rng = rng or random.Random()
+        self.session = requests.Session()
+
+    def call(self, method, path, endpoint=None, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=REQUEST_TIMEOUT, **kwargs)
+            status = response.status_code
+        except requests.RequestException:
+            response, status = None, 599  # 接続エラー・タイムアウト
+        self.stats.record(
+            endpoint or f"{method} {path.split('?')[0]}", (time.perf_counter() - started_at) * 1000, status
+        )
+        return response
+
+    def register_and_login(self):
+        email = f"{LOADTEST_EMAIL_PREFIX}{uuid.uuid4().hex}@example.com"
+        self.call(
+            "POST",
+            "/api/accounts/register/",
+            json={"email": email, "username": email.split("@")[0], "password": LOADTEST_PASSWORD},
+        )
+        response = self.call("POST", "/api/token/", json={"email": email, "password": LOADTEST_PASSWORD})
+        if response is None or response.status_code != 200:
+            return False
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access']}"
+        return True
+
+    def browse(self):
+        company_name = self.rng.choice(list(STANDIN_COMPANIES))
+        response = self.call("POST", "/api/stockmanager/search/", json={"company_name": company_name})
+        if response is None or response.status_code != 200:
+            return
+        symbol = response.json()["symbol"]
+
+        self.call("GET", f"/api/stockmanager/fetch/?symbol={symbol}")
+        self.call("POST", "/api/stockmanager/save/", json={"symbol": symbol})
+        self.call("GET", "/api/stockmanager/main/")
+
+    def run(self, iterations):
+        if not self.register_and_login():
+            return
+        for _ in range(iterations):
+            self.browse()
+
+
+# users 人が同時に利用の流れを iterations 回ずつ繰り返し、経過時間と集計を返す関数
+def run_load(base_url, users, iterations, ramp_up=0.0, seed=None):
+    stats = LoadStats()
+    rng = random.Random(seed)
+    threads = [
+        threading.Thread(
+            target=UserJourney(base_url, stats, random.Random(rng.random())).run,
+            args=(iterations,),
+            name=f"loadtest-user-{i}",
+        )
+        for i in range(users)
+    ]
+
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+        if ramp_up:
+            time.sleep(ramp_up / users)
+    for thread in threads:
+        thread.join()
+    return stats, time.perf_counter() - started_at
@@ -0,0 +1,181 @@
+import datetime
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# スタンドインが知っている企業（企業名 → 証券コード・ティッカー）
+# 銘柄一覧（SYMBOL_INDEX_PATH）にない名前にして、検索で ChatGPT のスタンドインが呼ばれるようにする
+STANDIN_COMPANIES = {
+    **{f"スタンドイン工業{i}": str(9900 + i) for i in range(20)},
+    **{f"Standin Holdings {i}": f"STD{i}" for i in range(20)},
+}
+SECTORS = [
+    ("Technology", "Software—Application"),
+    ("Consumer Cyclical", "Auto Manufacturers"),
+    ("Financial Services", "Banks—Regional"),
+    ("Healthcare", "Drug Manufacturers—General"),
+]
+
+
+# 銘柄ごとに毎回同じ値を返すための乱数
+def symbol_random(symbol):
+    return random.Random(zlib.crc32(str(symbol).encode()))
+
+
+# yfinance の info・balance_sheet・financials の最新期に相当するデータを作る関数
+def financials_payload(symbol):
+    rng = symbol_random(symbol)
+    sector, industry = SECTORS[rng.randrange(len(SECTORS))]
+    total_assets = rng.uniform(1e10, 1e12)
+    equity = total_assets * rng.uniform(0.2, 0.6)
+    revenue = total_assets * rng.uniform(0.3, 1.2)
+    return {
+        "info": {
+            "shortName": f"Standin {symbol}",
+            "regularMarketPrice": round(rng.uniform(10, 5000), 1),
+            "grossMargins": rng.uniform(0.1, 0.6),
+            "operatingMargins": rng.uniform(0.02, 0.3),
+            "ebitdaMargins": rng.uniform(0.05, 0.4),
+            "forwardPE": rng.uniform(5, 40),
+            "priceToBook": rng.uniform(0.5, 8),
+            "returnOnEquity": rng.uniform(0.0, 0.3),
+            "returnOnAssets": rng.uniform(0.0, 0.15),
+            "sector": sector,
+            "industry": industry,
+            "website": f"https://example.com/{symbol}",
+            "longBusinessSummary": f"Standin {symbol} is a stand-in company used for load testing.",
+        },
+        "balance_sheet": {
+            "Invested Capital": equity * 1.4,
+            "Stockholders Equity": equity,
+            "Total Assets": total_assets,
+            "Current Assets": total_assets * 0.4,
+            "Current Liabilities": total_assets * 0.25,
+            "Inventory": total_assets * 0.08,
+            "Net Tangible Assets": equity * 0.9,
+            "Long Term Debt": total_assets * 0.2,
+            "Total Liabilities Net Minority Interest": total_assets - equity,
+            "Total Debt": total_assets * 0.3,
+            "Cash And Cash Equivalents": total_assets * 0.1,
+        },
+        "financials": {
+            "EBIT": revenue * 0.1,
+            "Tax Rate For Calcs": 0.3,
+            "Net Income": revenue * 0.06,
+            "Total Revenue": revenue,
+        },
+    }
+
+
+# start 以上 end 未満の平日の日足を返す関数（PriceHistoryFetcher.get_history と同じ列の並び）
+def history_payload(symbol, start, end):
+    rng = symbol_random(symbol)
+    price = rng.uniform(10, 5000)
+    columns = [[], [], [], [], [], []]
+    day = datetime.date(2000, 1, 3)
+    while day < end:
+        price *= 1 + rng.gauss(0, 0.015)
+        if day >= start and day.weekday() < 5:
+            high, low = price * 1.01, price * 0.99
+            for column, value in zip(columns, [day.isoformat(), price, high, low, price, rng.randrange(10**4, 10**7)]):
+                column.append(value)
+        day += datetime.timedelta(days=1)
+    return columns
+
+
+# OpenAI の chat.completions と同じ形のレスポンスを作る関数
+def chat_completion(content):
+    return {
+        "id": f"chatcmpl-standin-{time.time_ns()}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": "gpt-4o-mini",
+        "choices": [
+            {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+        ],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+# getSymbol（企業名 → シンボル）・getSymbols（JSON で一括）・getTranslation に答える関数
+def answer_chat(messages):
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    user = next((m["content"] for m in messages if m["role"] == "user"), "")
+    if "JSON" in system:
+        names = json.loads(user)
+        return json.dumps({name: STANDIN_COMPANIES.get(name, "Invalid") for name in names}, ensure_ascii=False)
+    if "証券コード" in system:
+        name = user.split("の企業コード")[0]
+        return STANDIN_COMPANIES.get(name, "Invalid")
+    return f"（翻訳）{user}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    # 設定した遅延を入れ、一定の割合で 429 を返す（返したら True）
+    def simulate_upstream(self):
+        config = self.server.config
+        time.sleep(max(0.0, random.gauss(config["latency"], config["jitter"])))
+        if random.random() < config["rate_limit"]:
+            self.send_json(
+                429,
+                {"error": {"message": "Rate limit exceeded (stand-in)", "type": "rate_limit_error"}},
+                {"Retry-After": "0"},
+            )
+            return True
+        return False
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = url.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] not in ("financials", "history"):
+            self.send_json(404, {"error": "not found"})
+            return
+        if self.simulate_upstream():
+            return
+
+        if parts[0] == "financials":
+            self.send_json(200, financials_payload(parts[1]))
+        else:
+            params = parse_qs(url.query)
+            start = datetime.date.fromisoformat(params["start"][0])
+            end = datetime.date.fromisoformat(params["end"][0])
+            self.send_json(200, history_payload(parts[1], start, end))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": "not found"})
+            return
+        if self.simulate_upstream():
+            return
+        self.send_json(200, chat_completion(answer_chat(request.get("messages", []))))
+
+
+# yfinance・OpenAI のスタンドインを起動する関数（serve_forever は別スレッドで動かす）
+def start_standins(host="127.0.0.1", port=8765, latency=0.2, jitter=0.05, rate_limit=0.0):
+    server = ThreadingHTTPServer((host, port), StandInHandler)
+    server.daemon_threads = True
+    server.config = {"latency": latency, "jitter": jitter, "rate_limit": rate_limit}
+    thread = threading.Thread(target=server.serve_forever, name="standins", daemon=True)
+    thread.start()
+    return server
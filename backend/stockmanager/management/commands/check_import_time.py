@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# URL読み込みまでに import されてはいけない重いモジュール
+DEFERRED_MODULES = ("yfinance", "pandas", "numpy", "openai", "curl_cffi", "dotenv")
+IMPORT_TIME_BUDGET_MS = 1000  # URL読み込みまでの import 時間の上限
+
+STARTUP_SCRIPT = "import django; django.setup(); import stockmanagerApp.urls"
+
+
+# python -X importtime で起動時の import 時間を計測し、予算を超えたら失敗するコマンド
+# CI などで実行し、起動時間の悪化（重い依存の読み込み漏れ）を検知する
+class Command(BaseCommand):
+    help = "起動時（URL読み込みまで）の import 時間が予算内かを確認します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS, help="import 時間の上限（ミリ秒）"
+        )
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "stockmanagerApp.settings"))
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"起動スクリプトの実行に失敗しました:\n{result.stderr[-2000:]}")
+
+        total_us = 0
+        imported = set()
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:"):
+                continue
+            self_us, _, module = line[len("import time:"):].split("|")
+            if not self_us.strip().isdigit():
+                continue  # ヘッダー行
+            total_us += int(self_us)
+            imported.add(module.strip())
+
+        total_ms = total_us / 1000
+        loaded = sorted(name for name in imported if name.split(".")[0] in DEFERRED_MODULES)
+        self.stdout.write(f"import 時間: {total_ms:.1f} ms（上限 {options['budget_ms']:.0f} ms）")
+
+        if loaded:
+            roots = sorted({name.split(".")[0] for name in loaded})
+            raise CommandError(f"起動時に読み込まれてはいけないモジュールがあります: {', '.join(roots)}")
+        if total_ms > options["budget_ms"]:
+            raise CommandError(f"import 時間が上限を超えています: {total_ms:.1f} ms")
+
+        self.stdout.write(self.style.SUCCESS("✅ import 時間は予算内です"))
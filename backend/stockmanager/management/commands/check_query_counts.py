@@ -0,0 +1,128 @@
+import time
+import uuid
+from unittest import mock
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import CustomUser
+from accounts.tokens import CachedBlacklistRefreshToken, blacklist_cache
+from stockmanager.controller import metrics_cache_key, metrics_version_key
+from stockmanager.models import StockSymbol
+
+WATCHLIST_SIZES = [1, 500]
+NEW_SYMBOL = "QCNEW"
+
+# (説明, メソッド, パス, 送信データ, 許容するクエリ数)
+# お気に入りの件数に関係なく一定であること（銘柄ごとのクエリが増えていないこと）を確認する
+QUERY_BUDGETS = [
+    ("一覧", "get", "/api/stockmanager/main/", None, 1),
+    ("一覧（列指向）", "get", "/api/stockmanager/main/?layout=columnar", None, 1),
+    ("一覧（ストリーミング）", "get", "/api/stockmanager/main/stream/", None, 1),
+    ("ポートフォリオ", "get", "/api/stockmanager/portfolio/", None, 1),
+    ("詳細", "get", "/api/stockmanager/fetch/?symbol=QC0000", None, 1),
+    ("お気に入り状態", "get", "/api/stockmanager/saved/?symbol=QC0000", None, 1),
+    ("お気に入り登録", "post", "/api/stockmanager/save/", {"symbol": NEW_SYMBOL}, 1),
+    ("お気に入り登録（重複）", "post", "/api/stockmanager/save/", {"symbol": NEW_SYMBOL}, 1),
+    ("保有情報の更新", "post", "/api/stockmanager/save/", {"symbol": NEW_SYMBOL, "quantity": "10"}, 1),
+    ("お気に入り削除", "post", "/api/stockmanager/remove/", {"symbol": NEW_SYMBOL}, 1),
+    ("お気に入り削除（未登録）", "post", "/api/stockmanager/remove/", {"symbol": NEW_SYMBOL}, 1),
+    ("ログインユーザー", "get", "/api/accounts/user/", None, 0),
+    # 送信データの "{...}" は計測時に作るメールアドレス・refreshトークンに置き換える
+    ("ユーザー登録", "post", "/api/accounts/register/", {"email": "{email}", "username": "{username}", "password": "querycount-password"}, 2),
+    ("トークン更新", "post", "/api/token/refresh/", {"refresh": "{rotate_refresh}"}, 8),
+    ("ログアウト", "post", "/api/accounts/logout/", {"refresh": "{logout_refresh}"}, 4),
+    # アカウント削除は最後に行う（以降はこのユーザーで認証できない）
+    # 関連データの削除はリクエスト外で行うので、ここではリクエスト内のクエリだけを数える
+    ("アカウント削除", "delete", "/api/accounts/delete/", None, 1),
+]
+
+# テスト用のキャッシュ（実際の共有キャッシュには書き込まない）
+# 500 件分の指標が追い出されないよう上限を広げる（上流への問い合わせが起きないように）
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    }
+}
+TRANSACTION_STATEMENTS = ("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT")
+
+
+# お気に入り 1件・500件のユーザーで各 API のクエリ数を数え、上限を超えたら失敗するコマンド
+# 計測用のデータはトランザクションごとロールバックするので、実データは変更しない
+class Command(BaseCommand):
+    help = "お気に入りの件数を変えながら API ごとの SQL クエリ数が一定かを確認します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=WATCHLIST_SIZES, help="お気に入りの件数"
+        )
+
+    def handle(self, *args, **options):
+        failures = []
+        with override_settings(CACHES=TEST_CACHES):
+            for size in options["sizes"]:
+                self.stdout.write(f"お気に入り {size} 件")
+                with transaction.atomic():
+                    failures += self.measure(size)
+                    transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError("クエリ数が上限を超えています:\n" + "\n".join(failures))
+        self.stdout.write(self.style.SUCCESS("✅ すべての API のクエリ数が上限内です"))
+
+    def measure(self, size):
+        user = CustomUser.objects.create_user(
+            email=f"querycount-{uuid.uuid4().hex}@example.com", username=f"querycount-{uuid.uuid4().hex[:8]}"
+        )
+        symbols = [f"QC{i:04d}" for i in range(size)]
+        StockSymbol.objects.bulk_create(StockSymbol(symbol=symbol, user=user) for symbol in symbols)
+        self.seed_metrics(symbols)
+
+        client = Client(
+            SERVER_NAME="localhost",
+            HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}",
+        )
+        client.get("/api/accounts/user/")  # 認証ユーザーのキャッシュを温めておく
+
+        suffix = uuid.uuid4().hex
+        context = {
+            "email": f"querycount-{suffix}@example.com",
+            "username": f"querycount-{suffix[:8]}",
+            "rotate_refresh": str(CachedBlacklistRefreshToken.for_user(user)),
+            "logout_refresh": str(CachedBlacklistRefreshToken.for_user(user)),
+        }
+        # 無効化済みトークンの取り込みを済ませ、計測ごとにクエリ数がぶれないようにする
+        blacklist_cache.contains("")
+
+        failures = []
+        for label, method, path, data, budget in QUERY_BUDGETS:
+            if data:
+                data = {key: value.format(**context) for key, value in data.items()}
+            with CaptureQueriesContext(connection) as queries, mock.patch("accounts.views.schedule_purge"):
+                if data:
+                    response = getattr(client, method)(path, data, content_type="application/json")
+                else:
+                    response = getattr(client, method)(path)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+            count = sum(
+                1 for query in queries.captured_queries if not query["sql"].startswith(TRANSACTION_STATEMENTS)
+            )
+            self.stdout.write(f"  {label}: {count} クエリ（上限 {budget}、status {response.status_code}）")
+            if count > budget or response.status_code >= 500:
+                failures.append(f"{size} 件 / {label}: {count} クエリ（上限 {budget}、status {response.status_code}）")
+        return failures
+
+    # 上流に問い合わせないよう、全銘柄の指標をキャッシュに入れておく
+    def seed_metrics(self, symbols):
+        metrics = {"企業名": "Query Count", "株価": "$100.0", "PER": 15.0, "PBR": 1.2, "ROE": 10.0}
+        now = time.time()
+        entries = {}
+        for symbol in symbols + [NEW_SYMBOL]:
+            for include_overview in (False, True):
+                entries[metrics_cache_key(symbol, include_overview)] = metrics
+                entries[metrics_version_key(symbol, include_overview)] = now
+        cache.set_many(entries)
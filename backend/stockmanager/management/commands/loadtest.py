@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from stockmanager.loadtest.journeys import run_load
+from stockmanager.loadtest.standins import start_standins
+from .run_standins import standin_environ
+
+SERVER_START_TIMEOUT = 30  # 対象サーバーの起動を待つ秒数
+
+
+# 登録 → トークン取得 → 検索 → 詳細 → お気に入り登録 → 一覧 の流れを同時に実行し、
+# エンドポイントごとの RPS とレイテンシのパーセンタイルを表示するコマンド
+# --target を省略すると、スタンドインと gunicorn をローカルで起動して計測する（外部サービスには接続しない）
+# ローカルの gunicorn は一時ディレクトリのDB・キャッシュを使うので、実データには書き込まない
+class Command(BaseCommand):
+    help = "スタンドインを使ってユーザーの利用の流れを再現し、エンドポイントごとの性能を計測します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", help="計測する起動済みサーバーのURL（スタンドインを使う設定で起動しておく）")
+        parser.add_argument("--users", type=int, default=10, help="同時に利用するユーザー数")
+        parser.add_argument("--iterations", type=int, default=5, help="1ユーザーあたりの 検索〜一覧 の繰り返し回数")
+        parser.add_argument("--ramp-up", type=float, default=0.0, help="全ユーザーが開始するまでの秒数")
+        parser.add_argument("--seed", type=int, help="検索する企業を選ぶ乱数のシード")
+        parser.add_argument("--port", type=int, default=8777, help="ローカルで起動するサーバーのポート")
+        parser.add_argument("--workers", type=int, default=2, help="ローカルで起動する gunicorn のワーカー数")
+        parser.add_argument("--standin-port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.2, help="スタンドインの平均応答遅延（秒）")
+        parser.add_argument("--jitter", type=float, default=0.05, help="スタンドインの応答遅延のばらつき（秒）")
+        parser.add_argument("--rate-limit", type=float, default=0.0, help="スタンドインが 429 を返す割合（0〜1）")
+        parser.add_argument("--json", dest="json_path", help="結果を JSON で保存するパス")
+
+    def handle(self, *args, **options):
+        server = process = workdir = None
+        target = options["target"]
+        if not target:
+            # 実際のDB・キャッシュ・スナップショットには書き込まないよう、一時ディレクトリに分ける
+            workdir = tempfile.mkdtemp(prefix="stockmanager-loadtest-")
+            server = start_standins(
+                port=options["standin_port"],
+                latency=options["latency"],
+                jitter=options["jitter"],
+                rate_limit=options["rate_limit"],
+            )
+            target = f"http://127.0.0.1:{options['port']}"
+            try:
+                process = self.start_server(
+                    options, f"http://127.0.0.1:{options['standin_port']}", workdir
+                )
+            except Exception:
+                server.shutdown()
+                shutil.rmtree(workdir, ignore_errors=True)
+                raise
+
+        try:
+            self.stdout.write(f"{options['users']} ユーザー × {options['iterations']} 回 → {target}")
+            stats, elapsed = run_load(
+                target, options["users"], options["iterations"], options["ramp_up"], options["seed"]
+            )
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+            if server is not None:
+                server.shutdown()
+            if workdir is not None:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+        rows = stats.summary(elapsed)
+        self.print_report(rows, elapsed)
+        if options["json_path"]:
+            with open(options["json_path"], "w", encoding="utf-8") as f:
+                json.dump({"elapsed": elapsed, "endpoints": rows}, f, ensure_ascii=False, indent=2)
+
+    # 一時ディレクトリのDB・キャッシュ・保存先を使う環境変数
+    def isolated_environ(self, workdir):
+        return {
+            "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'db.sqlite3')}",
+            "CACHE_BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "CACHE_LOCATION": os.path.join(workdir, "cache"),
+            "METRICS_SNAPSHOT_PATH": os.path.join(workdir, "snapshots", "metrics.npy"),
+            "PRICE_HISTORY_DIR": os.path.join(workdir, "history"),
+            "PEER_LOCK_DIR": os.path.join(workdir, "locks"),
+        }
+
+    # スタンドインを使う設定で gunicorn を起動し、応答するまで待つ
+    def start_server(self, options, standin_url, workdir):
+        env = dict(os.environ, **standin_environ(standin_url), **self.isolated_environ(workdir))
+        env["ALLOWED_HOSTS"] = ",".join(dict.fromkeys(settings.ALLOWED_HOSTS + ["127.0.0.1"]))
+        subprocess.run(
+            [sys.executable, "manage.py", "migrate", "--noinput", "-v", "0"],
+            cwd=settings.BASE_DIR,
+            env=env,
+            check=True,
+        )
+        process = subprocess.Popen(
+            [
+                sys.executable, "-m", "gunicorn", "stockmanagerApp.wsgi:application",
+                "-c", "gunicorn.conf.py",
+                "--bind", f"127.0.0.1:{options['port']}",
+                "--workers", str(options["workers"]),
+                "--threads", "4",
+                "--timeout", "120",
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+
+        deadline = time.monotonic() + SERVER_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError("対象サーバーの起動に失敗しました")
+            try:
+                requests.get(f"http://127.0.0.1:{options['port']}/api/accounts/user/", timeout=1)
+                return process
+            except requests.RequestException:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError("対象サーバーが起動しませんでした")
+
+    def print_report(self, rows, elapsed):
+        total = sum(row["count"] for row in rows)
+        self.stdout.write(f"\n経過時間 {elapsed:.1f} 秒 / 合計 {total} リクエスト（{total / elapsed:.1f} req/s）\n")
+        self.stdout.write(
+            f"{'endpoint':<36}{'count':>7}{'req/s':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint']:<36}{row['count']:>7}{row['rps']:>8.1f}{row['p50']:>9.0f}"
+                f"{row['p90']:>9.0f}{row['p99']:>9.0f}{row['max']:>9.0f}{row['errors']:>8}"
+            )
+        errors = {row["endpoint"]: row["statuses"] for row in rows if row["errors"]}
+        if errors:
+            self.stdout.write(self.style.WARNING(f"エラーのあったエンドポイント: {errors}"))
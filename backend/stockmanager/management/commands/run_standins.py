@@ -0,0 +1,48 @@
+import time
+from django.core.management.base import BaseCommand
+from stockmanager.loadtest.standins import start_standins
+
+STANDIN_SERVICES = (
+    "financials=stockmanager.loadtest.clients:StandInFinancialsFetcher,"
+    "history=stockmanager.loadtest.clients:StandInHistoryFetcher"
+)
+
+
+# yfinance・OpenAI のスタンドイン（ローカルの HTTP サーバー）を起動するコマンド
+# 負荷試験の対象サーバーは、表示される環境変数をつけて起動する
+class Command(BaseCommand):
+    help = "負荷試験用に yfinance・OpenAI のスタンドインを起動します"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument("--latency", type=float, default=0.2, help="平均の応答遅延（秒）")
+        parser.add_argument("--jitter", type=float, default=0.05, help="応答遅延のばらつき（標準偏差、秒）")
+        parser.add_argument("--rate-limit", type=float, default=0.0, help="429 を返す割合（0〜1）")
+
+    def handle(self, *args, **options):
+        server = start_standins(
+            options["host"], options["port"], options["latency"], options["jitter"], options["rate_limit"]
+        )
+        url = f"http://{options['host']}:{options['port']}"
+        self.stdout.write(self.style.SUCCESS(f"✅ スタンドインを起動しました: {url}"))
+        self.stdout.write("対象サーバーは次の環境変数をつけて起動してください:")
+        for key, value in standin_environ(url).items():
+            self.stdout.write(f"  {key}={value}")
+
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+
+
+# 対象サーバーがスタンドインを使うための環境変数
+def standin_environ(url):
+    return {
+        "SERVICE_OVERRIDES": STANDIN_SERVICES,
+        "LOADTEST_UPSTREAM_URL": url,
+        "OPENAI_BASE_URL": f"{url}/v1",
+        "OpenAI_API_KEY": "standin",
+        "UPSTREAM_FETCH_DELAY": "0",
+    }
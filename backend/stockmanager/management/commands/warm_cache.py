@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from stockmanager.controller import WARMUP_SYMBOL_LIMIT, most_watched_symbols, warm_cache
+
+
+# デプロイ直後にお気に入り登録数の多い銘柄をキャッシュ・スナップショットへ読み込むコマンド
+class Command(BaseCommand):
+    help = "お気に入り登録数の多い銘柄の財務指標を事前にキャッシュします"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=WARMUP_SYMBOL_LIMIT,
+            help="事前取得する銘柄数の上限",
+        )
+        parser.add_argument(
+            "--refresh",
+            action="store_true",
+            help="キャッシュ済みの銘柄も取得し直す（定期実行でスナップショットを更新する場合）",
+        )
+
+    def handle(self, *args, **options):
+        symbols = most_watched_symbols(options["limit"])
+        warmed, failed = warm_cache(symbols, refresh=options["refresh"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ {len(warmed)} 銘柄をキャッシュしました"))
+        if failed:
+            self.stdout.write(self.style.WARNING(f"⚠️ 取得失敗: {', '.join(failed)}"))
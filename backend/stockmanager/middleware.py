@@ -0,0 +1,10 @@
+from django.middleware.gzip import GZipMiddleware
+
+
+# ストリーミングのレスポンスは圧縮しない GZipMiddleware
+# Django の gzip はチャンクごとにフラッシュしないため、NDJSON / SSE の行が最後までクライアントに届かなくなる
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if response.streaming:
+            return response
+        return super().process_response(request, response)
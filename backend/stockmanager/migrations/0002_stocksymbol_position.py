@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-19 19:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("stockmanager", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stocksymbol",
+            name="cost_basis",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=20, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="stocksymbol",
+            name="quantity",
+            field=models.DecimalField(
+                blank=True, decimal_places=4, max_digits=20, null=True
+            ),
+        ),
+    ]
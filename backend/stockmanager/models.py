@@ -5,6 +5,8 @@ class StockSymbol(models.Model):
     symbol = models.CharField(max_length=10)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='stock_symbols')
     created_at = models.DateTimeField(auto_now_add=True)
+    quantity = models.DecimalField(max_digits=20, decimal_places=4, null=True, blank=True)  # 保有株数（未入力ならお気に入りのみ）
+    cost_basis = models.DecimalField(max_digits=20, decimal_places=4, null=True, blank=True)  # 1株あたりの取得単価
 
     class Meta:
         unique_together = ('symbol', 'user')  # 同一ユーザーが同じ銘柄を複数登録しないようにする
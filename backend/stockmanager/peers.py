@@ -0,0 +1,231 @@
+import bisect
+import fcntl
+import hashlib
+import logging
+import math
+import os
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from .snapshot import NUMERIC_FIELDS
+from .utils import convert_symbol
+
+PEER_GROUPS = ("sector", "industry")  # 集計するグループ（yfinance の info のキー）
+PEER_LOCK_TIMEOUT = 5  # 集計を更新するロックを待つ秒数（取れなければ今回の更新は見送る）
+PERCENTILE_POINTS = 101  # 詳細画面用の要約に持たせる分位点の数（これ以下の銘柄数なら全値を持つ）
+
+logger = logging.getLogger(__name__)
+
+
+def peer_group_key(kind, name):
+    digest = hashlib.sha1(str(name).encode()).hexdigest()
+    return f"peer_stats_{kind}_{digest}"
+
+
+# 詳細画面で読む要約（中央値・四分位・分位点の表）を保存するキー
+def peer_summary_key(kind, name):
+    return f"{peer_group_key(kind, name)}_summary"
+
+
+# 銘柄がどのセクター・業種の集計に入っているかを保存するキー
+def peer_membership_key(symbol):
+    return f"peer_groups_{symbol}"
+
+
+# 指標のうち集計対象になる数値だけを取り出す関数（N/A・データなしは除く）
+def numeric_metrics(metrics):
+    values = {}
+    for _, key in NUMERIC_FIELDS:
+        value = metrics.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if math.isnan(value):
+            continue
+        values[key] = float(value)
+    return values
+
+
+# ソート済みのリストから分位点を求める関数（線形補間）
+def quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    value = sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+    return round(value, 2)
+
+
+# セクター・業種ごとの指標を、指標ごとのソート済みリストで保持するクラス
+# 銘柄の追加・更新・削除は bisect で差分だけ反映し、全銘柄を走査し直さない
+class PeerGroupStats:
+    def __init__(self, state=None):
+        state = state or {}
+        self.members = state.get("members", {})  # symbol -> {指標名: 値}
+        self.values = state.get("values", {})  # 指標名 -> ソート済みの値
+        self.updated_at = state.get("updated_at")
+
+    def state(self):
+        return {"members": self.members, "values": self.values, "updated_at": self.updated_at}
+
+    def __len__(self):
+        return len(self.members)
+
+    def remove(self, symbol):
+        previous = self.members.pop(symbol, None)
+        if previous is None:
+            return
+        for key, value in previous.items():
+            values = self.values.get(key, [])
+            i = bisect.bisect_left(values, value)
+            if i < len(values) and values[i] == value:
+                values.pop(i)
+        self.updated_at = time.time()
+
+    def add(self, symbol, values):
+        self.remove(symbol)
+        self.members[symbol] = values
+        for key, value in values.items():
+            bisect.insort(self.values.setdefault(key, []), value)
+        self.updated_at = time.time()
+
+    # 詳細画面で読む要約を作る関数
+    # 読むたびに全銘柄の値を復元しないよう、指標ごとに固定数の分位点だけを持たせる
+    def summary_state(self):
+        metrics = {}
+        for key, values in self.values.items():
+            if not values:
+                continue
+            if len(values) <= PERCENTILE_POINTS:
+                points = list(values)
+            else:
+                last = len(values) - 1
+                points = [values[round(last * i / (PERCENTILE_POINTS - 1))] for i in range(PERCENTILE_POINTS)]
+            metrics[key] = {
+                "count": len(values),
+                "median": quantile(values, 0.5),
+                "q1": quantile(values, 0.25),
+                "q3": quantile(values, 0.75),
+                "points": points,
+            }
+        return {"count": len(self.members), "metrics": metrics, "updated_at": self.updated_at}
+
+
+# 要約の指標の統計と、value のグループ内順位（パーセンタイル）を返す関数
+def metric_summary(stats, value=None):
+    result = {key: stats[key] for key in ("count", "median", "q1", "q3")}
+    points = stats["points"]
+    if value is not None and points:
+        # 同じ値の銘柄は順位の中央をとる（分位点の表なら誤差は1ポイント程度）
+        below = bisect.bisect_left(points, value)
+        not_above = bisect.bisect_right(points, value)
+        result["percentile"] = round((below + not_above) / 2 / len(points) * 100, 1)
+    return result
+
+
+# 複数プロセスから同じグループを同時に書き換えないためのロック（snapshot.py と同じくファイルロック）
+# PEER_LOCK_TIMEOUT 秒待っても取れなければ False を返す
+@contextmanager
+def peer_group_lock(key):
+    os.makedirs(settings.PEER_LOCK_DIR, exist_ok=True)
+    with open(os.path.join(settings.PEER_LOCK_DIR, f"{key}.lock"), "w") as lock_file:
+        deadline = time.monotonic() + PEER_LOCK_TIMEOUT
+        while True:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                acquired = True
+                break
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    acquired = False
+                    break
+                time.sleep(0.01)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _update_group(kind, name, update):
+    key = peer_group_key(kind, name)
+    with peer_group_lock(key) as acquired:
+        if not acquired:
+            logger.warning("⚠️ %s の集計のロックが取れなかったため更新を見送りました", name)
+            return
+        group = PeerGroupStats(cache.get(key))
+        update(group)
+        if len(group):
+            cache.set_many({key: group.state(), peer_summary_key(kind, name): group.summary_state()}, None)
+        else:
+            cache.delete_many([key, peer_summary_key(kind, name)])
+
+
+# 上流から取得した銘柄の指標をセクター・業種の集計に反映する関数
+def update_peer_stats(symbol, classification, metrics):
+    symbol = str(convert_symbol(symbol))
+    values = numeric_metrics(metrics)
+    groups = {kind: classification.get(kind) for kind in PEER_GROUPS if classification.get(kind)}
+    previous = cache.get(peer_membership_key(symbol)) or {}
+
+    for kind in PEER_GROUPS:
+        old, new = previous.get(kind), groups.get(kind)
+        if old and old != new:
+            _update_group(kind, old, lambda group: group.remove(symbol))
+        if new:
+            _update_group(kind, new, lambda group: group.add(symbol, values))
+
+    cache.set(peer_membership_key(symbol), groups, None)
+
+
+# 銘柄を集計から外す関数（お気に入り登録者がいなくなった銘柄）
+def remove_from_peer_stats(symbol):
+    symbol = str(convert_symbol(symbol))
+    groups = cache.get(peer_membership_key(symbol)) or {}
+    for kind, name in groups.items():
+        _update_group(kind, name, lambda group: group.remove(symbol))
+    cache.delete(peer_membership_key(symbol))
+
+
+# 銘柄が属するセクター・業種の要約を返す関数
+def _peer_summaries(symbol):
+    groups = cache.get(peer_membership_key(str(convert_symbol(symbol)))) or {}
+    keys = {peer_summary_key(kind, name): (kind, name) for kind, name in groups.items()}
+    summaries = cache.get_many(list(keys))
+
+    # 要約を持たない以前の集計は、一度だけ全体から要約を作って保存する
+    for key, (kind, name) in keys.items():
+        if key not in summaries:
+            state = cache.get(peer_group_key(kind, name))
+            if state:
+                summaries[key] = PeerGroupStats(state).summary_state()
+                cache.set(key, summaries[key], None)
+
+    return {
+        kind: (name, summaries[key])
+        for key, (kind, name) in keys.items()
+        if key in summaries
+    }
+
+
+# 銘柄が属するセクター・業種の最終更新時刻（詳細レスポンスの ETag に含める）
+def peer_version(symbol):
+    return {kind: summary["updated_at"] for kind, (_, summary) in _peer_summaries(symbol).items()}
+
+
+# 詳細画面用に、セクター・業種の統計と銘柄のパーセンタイルを返す関数
+def peer_context(symbol, metrics):
+    values = numeric_metrics(metrics)
+    context = {}
+    for kind, (name, summary) in _peer_summaries(symbol).items():
+        context[kind] = {
+            "name": name,
+            "count": summary["count"],
+            "metrics": {
+                key: metric_summary(summary["metrics"][key], values.get(key))
+                for _, key in NUMERIC_FIELDS
+                if key in summary["metrics"]
+            },
+        }
+    return context
@@ -0,0 +1,125 @@
+import time
+from django.core.cache import cache
+from .controller import CACHE_TIMEOUT, SNAPSHOT_MAX_STALE, metrics_cache_key, revalidate_snapshot
+from .snapshot import checked_at, get_snapshot, metrics_to_row, snapshot_dtype
+from .utils import convert_symbol
+
+CURRENCIES = {"¥": "JPY", "$": "USD"}  # get_all_metrics の株価の先頭文字 → 通貨
+WEIGHTED_METRICS = [("per", "PER"), ("pbr", "PBR"), ("roe", "ROE")]
+# PER・PBR は評価額で重み付けした調和平均（ポートフォリオ全体の利益・純資産に対する倍率）
+HARMONIC_METRICS = {"per", "pbr"}
+
+
+# 銘柄の指標を、キャッシュ → スナップショットの順に探して構造化配列にまとめる関数
+# 上流には問い合わせない（どちらにもない銘柄は found=False）
+# スナップショットの古い行は、fetch_company_data と同じく返しつつ裏で取り直す
+def metrics_rows(symbols):
+    import numpy as np
+
+    keys = [str(convert_symbol(symbol)) for symbol in symbols]
+    rows = np.zeros(len(keys), dtype=snapshot_dtype())
+    found = np.zeros(len(keys), dtype=bool)
+    position = {key: i for i, key in enumerate(keys)}
+
+    cache_keys = {metrics_cache_key(convert_symbol(key)): key for key in keys}
+    for cache_key, metrics in cache.get_many(list(cache_keys)).items():
+        i = position[cache_keys[cache_key]]
+        rows[i], found[i] = metrics_to_row(cache_keys[cache_key], metrics, 0.0), True
+
+    missing = [key for key in keys if not found[position[key]]]
+    snapshot_rows = get_snapshot().get_rows(missing, SNAPSHOT_MAX_STALE)
+    now = time.time()
+    for row in snapshot_rows:
+        i = position[str(row["symbol"])]
+        # ファイルによって列の幅・有無が違うので列名で写す
+        for field in snapshot_rows.dtype.names:
+            if field in rows.dtype.names:
+                rows[field][i] = row[field]
+        found[i] = True
+        if now - float(checked_at(row)) > CACHE_TIMEOUT:
+            revalidate_snapshot(str(row["symbol"]))
+
+    return rows, found
+
+
+def weighted_average(values, weights, harmonic=False):
+    import numpy as np
+
+    valid = np.isfinite(values) & (weights > 0)
+    if harmonic:
+        valid &= values > 0
+    if not valid.any():
+        return None
+    values, weights = values[valid], weights[valid]
+    if harmonic:
+        result = weights.sum() / (weights / values).sum()
+    else:
+        result = (values * weights).sum() / weights.sum()
+    return round(float(result), 2)
+
+
+# ポートフォリオの評価額・損益・加重平均指標を通貨別に集計する関数
+# positions: [(symbol, quantity, cost_basis), ...]（quantity が None の銘柄はお気に入りのみ）
+def portfolio_summary(positions):
+    import numpy as np
+
+    symbols = [symbol for symbol, _, _ in positions]
+    quantity = np.array([float(q) if q is not None else np.nan for _, q, _ in positions], dtype="f8")
+    cost_basis = np.array([float(c) if c is not None else np.nan for _, _, c in positions], dtype="f8")
+    rows, found = metrics_rows(symbols)
+
+    held = np.isfinite(quantity) & (quantity > 0)
+    priced = held & found & np.isfinite(rows["price"])
+    market_value = np.where(priced, quantity * rows["price"], np.nan)
+    cost = np.where(held & np.isfinite(cost_basis), quantity * cost_basis, np.nan)
+
+    currencies = {}
+    for mark, code in CURRENCIES.items():
+        in_currency = priced & (rows["currency"] == mark)
+        if not in_currency.any():
+            continue
+        weights = np.where(in_currency, market_value, 0.0)
+        total_value = float(weights.sum())
+        with_cost = in_currency & np.isfinite(cost)
+        total_cost = float(cost[with_cost].sum())
+        gain = float(market_value[with_cost].sum()) - total_cost
+
+        summary = {
+            "positions": int(in_currency.sum()),
+            "market_value": round(total_value, 2),
+            "cost": round(total_cost, 2) if with_cost.any() else None,
+            "unrealized_gain": round(gain, 2) if with_cost.any() else None,
+            "unrealized_gain_pct": round(gain / total_cost * 100, 2) if total_cost else None,
+        }
+        for field, label in WEIGHTED_METRICS:
+            summary[label] = weighted_average(rows[field], weights, harmonic=field in HARMONIC_METRICS)
+        currencies[code] = summary
+
+    # 通貨内での評価額の比率
+    currency_total = np.full(len(symbols), np.nan)
+    for mark in CURRENCIES:
+        in_currency = rows["currency"] == mark
+        currency_total[in_currency] = np.nansum(market_value[in_currency])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = market_value / currency_total * 100
+
+    def number(value):
+        return round(float(value), 2) if np.isfinite(value) else None
+
+    return {
+        "currencies": currencies,
+        "positions": [
+            {
+                "symbol": symbol,
+                "quantity": number(quantity[i]),
+                "cost_basis": number(cost_basis[i]),
+                "currency": CURRENCIES.get(str(rows["currency"][i])),
+                "price": number(rows["price"][i]) if found[i] else None,
+                "market_value": number(market_value[i]),
+                "weight": number(weight[i]),
+            }
+            for i, symbol in enumerate(symbols)
+        ],
+        # キャッシュにもスナップショットにもない銘柄（一覧画面を開くと取得される）
+        "missing": [symbol for i, symbol in enumerate(symbols) if not found[i]],
+    }
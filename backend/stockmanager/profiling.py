@@ -0,0 +1,128 @@
+import cProfile
+import io
+import json
+import logging
+import pstats
+import random
+import time
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+slow_request_logger = logging.getLogger("stockmanager.slow_requests")
+
+PROFILED_PATH_PREFIXES = ("/api/stockmanager/", "/api/accounts/", "/api/token/")
+PROFILE_HEADER = "X-Profile-Request"  # 値が REQUEST_PROFILING_TOKEN と一致したリクエストを計測する
+PROFILE_TOP_FUNCTIONS = 30  # ログに残す関数の数（累積時間順）
+
+# リクエスト中に取得した銘柄と、どこから取れたか（cache / snapshot / upstream / error）
+_request_trace = ContextVar("request_trace", default=None)
+
+
+# 銘柄の取得結果を現在のリクエストの記録に追加する関数（リクエスト外では何もしない）
+def record_symbol(symbol, tier, started_at=None):
+    trace = _request_trace.get()
+    if trace is None:
+        return
+    entry = {"symbol": str(symbol), "tier": tier}
+    if started_at is not None:
+        entry["ms"] = round((time.monotonic() - started_at) * 1000, 1)
+    trace["symbols"].append(entry)
+
+
+# パスワードのハッシュ計算の待ち時間・計算時間を現在のリクエストの記録に追加する関数
+# 記録したリクエストの slow request ログには、ハッシュ計算プール全体の統計も載せる
+def record_password_hashing(queue_seconds, hash_seconds):
+    trace = _request_trace.get()
+    if trace is None:
+        return
+    trace.setdefault("password_hashing", []).append(
+        {"queue_ms": round(queue_seconds * 1000, 1), "hash_ms": round(hash_seconds * 1000, 1)}
+    )
+
+
+# SQL の実行回数と時間を数える execute_wrapper
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.monotonic() - started_at
+
+
+# stockmanager・accounts の API を対象に、遅いリクエストを構造化ログに残すミドルウェア
+# REQUEST_PROFILING_ENABLED のときは、ヘッダーまたはサンプリングで選んだリクエストを cProfile で計測する
+class RequestProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "REQUEST_PROFILING_ENABLED", False)
+        self.sample_rate = getattr(settings, "REQUEST_PROFILING_SAMPLE_RATE", 0.0)
+        self.token = getattr(settings, "REQUEST_PROFILING_TOKEN", "")
+        self.slow_ms = getattr(settings, "SLOW_REQUEST_THRESHOLD_MS", 1000)
+
+    def should_profile(self, request):
+        if not self.enabled:
+            return False
+        header = request.headers.get(PROFILE_HEADER)
+        if header and self.token and header == self.token:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def __call__(self, request):
+        if not request.path.startswith(PROFILED_PATH_PREFIXES):
+            return self.get_response(request)
+
+        trace = {"symbols": []}
+        token = _request_trace.set(trace)
+        queries = QueryCounter()
+        profiler = cProfile.Profile() if self.should_profile(request) else None
+
+        started_at = time.monotonic()
+        try:
+            with connection.execute_wrapper(queries):
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _request_trace.reset(token)
+        duration_ms = (time.monotonic() - started_at) * 1000
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "query": request.GET.urlencode(),
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 1),
+            "user_id": getattr(getattr(request, "user", None), "pk", None),
+            "sql": {"count": queries.count, "ms": round(queries.seconds * 1000, 1)},
+            "symbols": trace["symbols"],
+            # ストリーミングのレスポンスは本文の送信前までの時間
+            "streaming": response.streaming,
+        }
+        if "password_hashing" in trace:
+            from accounts.hashing import hashing_pool
+
+            record["password_hashing"] = {"calls": trace["password_hashing"], "pool": hashing_pool.stats()}
+
+        if profiler is not None:
+            response["Server-Timing"] = (
+                f"total;dur={duration_ms:.1f}, db;dur={queries.seconds * 1000:.1f};desc=\"{queries.count} queries\""
+            )
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(PROFILE_TOP_FUNCTIONS)
+            logger.info("profile %s %s\n%s", request.method, request.path, stream.getvalue())
+
+        if duration_ms >= self.slow_ms or profiler is not None:
+            slow_request_logger.warning(json.dumps(record, ensure_ascii=False))
+        return response
@@ -0,0 +1,194 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from accounts.authentication import CachedJWTAuthentication
+from .controller import fetch_company_data
+from .models import StockSymbol
+from .utils import convert_symbol
+
+QUOTE_REFRESH_INTERVAL = 60  # 購読中の銘柄を再取得する間隔（秒）
+SUBSCRIBER_QUEUE_SIZE = 100  # クライアントごとに溜めておける未送信メッセージの数（超えたら切断する）
+SLOW_CONSUMER_CLOSE_CODE = 4408
+WEBSOCKET_PATH = "/ws/stockmanager/quotes/"
+
+
+# 銘柄ごとに1つの更新ループを持ち、購読中の全クライアントへ変更点だけを配信するクラス
+class QuoteHub:
+    def __init__(self, interval=QUOTE_REFRESH_INTERVAL):
+        self.interval = interval
+        self.subscribers = {}  # symbol -> {queue, ...}
+        self.latest = {}  # symbol -> 最後に配信した指標
+        self.tasks = {}  # symbol -> 更新ループ
+
+    # メッセージを送信待ちに入れる関数（受け取りが追いつかないクライアントは全購読を外して切断させる）
+    def deliver(self, queue, message):
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.drop(queue)
+
+    def drop(self, queue):
+        for symbol in list(self.subscribers):
+            if queue in self.subscribers[symbol]:
+                self.unsubscribe(symbol, queue)
+        # 溜まっているメッセージを捨て、送信側に切断を知らせる
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    # 購読を開始し、手元にある最新値があれば全項目をすぐに送る関数
+    def subscribe(self, symbol, queue):
+        self.subscribers.setdefault(symbol, set()).add(queue)
+        if symbol in self.latest:
+            self.deliver(
+                queue, {"type": "snapshot", "symbol": symbol, "metrics": self.latest[symbol]}
+            )
+        if symbol not in self.tasks:
+            self.tasks[symbol] = asyncio.create_task(self._refresh_loop(symbol))
+
+    # 購読を解除し、購読者がいなくなった銘柄の更新ループを止める関数
+    def unsubscribe(self, symbol, queue):
+        queues = self.subscribers.get(symbol)
+        if not queues:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[symbol]
+            self.latest.pop(symbol, None)
+            task = self.tasks.pop(symbol, None)
+            if task:
+                task.cancel()
+
+    def publish(self, symbol, metrics):
+        previous = self.latest.get(symbol)
+        self.latest[symbol] = metrics
+
+        if previous is None:
+            message = {"type": "snapshot", "symbol": symbol, "metrics": metrics}
+        else:
+            changes = {
+                key: value for key, value in metrics.items() if previous.get(key) != value
+            }
+            if not changes:
+                return
+            message = {"type": "update", "symbol": symbol, "changes": changes}
+
+        for queue in list(self.subscribers.get(symbol, ())):
+            self.deliver(queue, message)
+
+    async def _refresh_loop(self, symbol):
+        # 初回はキャッシュを使い、以降は上流から取り直す
+        force_refresh = False
+        while True:
+            try:
+                metrics = await sync_to_async(fetch_company_data, thread_sensitive=False)(
+                    symbol, force_refresh=force_refresh
+                )
+                self.publish(symbol, metrics)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                for queue in list(self.subscribers.get(symbol, ())):
+                    self.deliver(
+                        queue,
+                        {
+                            "type": "error",
+                            "symbol": symbol,
+                            "error": f"{symbol} のデータ取得に失敗しました: {str(e)}",
+                        },
+                    )
+            force_refresh = True
+            await asyncio.sleep(self.interval)
+
+
+hub = QuoteHub()
+
+
+# クエリ文字列のアクセストークンからユーザーを取得する関数
+def authenticate_websocket(scope):
+    params = parse_qs(scope.get("query_string", b"").decode())
+    raw_token = (params.get("token") or [None])[0]
+    if not raw_token:
+        return None
+
+    authenticator = CachedJWTAuthentication()
+    try:
+        validated_token = authenticator.get_validated_token(raw_token)
+        return authenticator.get_user(validated_token)
+    except Exception:
+        return None
+
+
+def get_watchlist(user):
+    return [
+        str(convert_symbol(symbol))
+        for symbol in StockSymbol.objects.filter(user=user).values_list("symbol", flat=True)
+    ]
+
+
+# WebSocket 接続を処理するASGIアプリ
+# 接続時にお気に入り銘柄を購読し、{"action": "subscribe" | "unsubscribe", "symbols": [...]} で変更できる
+async def websocket_application(scope, receive, send):
+    message = await receive()
+    if message["type"] != "websocket.connect":
+        return
+
+    if scope["path"] != WEBSOCKET_PATH:
+        await send({"type": "websocket.close", "code": 4404})
+        return
+
+    user = await sync_to_async(authenticate_websocket)(scope)
+    if user is None:
+        await send({"type": "websocket.close", "code": 4401})
+        return
+
+    await send({"type": "websocket.accept"})
+
+    queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+    subscribed = set()
+    watchlist = await sync_to_async(get_watchlist)(user)
+    for symbol in watchlist:
+        hub.subscribe(symbol, queue)
+        subscribed.add(symbol)
+
+    async def sender():
+        while True:
+            payload = await queue.get()
+            if payload is None:
+                # 受け取りが追いつかないので切断する
+                await send({"type": "websocket.close", "code": SLOW_CONSUMER_CLOSE_CODE})
+                return
+            await send({"type": "websocket.send", "text": json.dumps(payload, ensure_ascii=False)})
+
+    sender_task = asyncio.create_task(sender())
+    try:
+        while True:
+            message = await receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message["type"] != "websocket.receive":
+                continue
+
+            try:
+                data = json.loads(message.get("text") or "{}")
+                action = data.get("action")
+                symbols = {str(convert_symbol(symbol)) for symbol in data.get("symbols", [])}
+            except (ValueError, AttributeError, TypeError):
+                hub.deliver(queue, {"type": "error", "error": "不正なメッセージです"})
+                continue
+
+            if action == "subscribe":
+                # お気に入り登録済みの銘柄だけ購読できる
+                watchlist = set(await sync_to_async(get_watchlist)(user))
+                for symbol in (symbols & watchlist) - subscribed:
+                    hub.subscribe(symbol, queue)
+                    subscribed.add(symbol)
+            elif action == "unsubscribe":
+                for symbol in symbols & subscribed:
+                    hub.unsubscribe(symbol, queue)
+                    subscribed.discard(symbol)
+    finally:
+        sender_task.cancel()
+        for symbol in subscribed:
+            hub.unsubscribe(symbol, queue)
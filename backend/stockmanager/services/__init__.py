@@ -0,0 +1,53 @@
+import importlib
+import os
+import threading
+from django.conf import settings
+
+# 外部サービスのクライアント（サービス名 → "モジュール:クラス"）
+# yfinance / pandas / OpenAI SDK は読み込みが重いので、初めて使うときに import する
+SERVICES = {
+    "chatgpt": "stockmanager.services.chatgpt:ChatGPT",
+    "financials": "stockmanager.services.yahoofinance:CompanyFinancialsFetcher",
+    "history": "stockmanager.services.yahoofinance:PriceHistoryFetcher",
+}
+
+_loaded = {}
+_clients = {}  # プロセスごとに作り直すクライアント（OpenAI, HTTPセッションなど）
+_lock = threading.Lock()
+
+
+# サービス名からクラスを取得する関数（初回のみ import する）
+def get_service(name):
+    service = _loaded.get(name)
+    if service is None:
+        with _lock:
+            service = _loaded.get(name)
+            if service is None:
+                # SERVICE_OVERRIDES で差し替えられていればそちらを使う（負荷試験のスタンドインなど）
+                path = getattr(settings, "SERVICE_OVERRIDES", {}).get(name, SERVICES[name])
+                module_path, attr = path.split(":")
+                service = getattr(importlib.import_module(module_path), attr)
+                _loaded[name] = service
+    return service
+
+
+# プロセス内で共有するクライアントを取得する関数（fork 後の子プロセスでは作り直す）
+def get_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+    return client
+
+
+# fork した子プロセスで親のクライアント（ソケット・スレッドを持つ）を使わないようにする
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+    _clients.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -1,7 +1,9 @@
+import json
 import os
 from dotenv import load_dotenv
 from pathlib import Path
 from openai import OpenAI
+from . import get_client
 
 
 # プロジェクトのルートを取得
@@ -15,7 +17,10 @@ class ChatGPT:
     def __init__(self):
         self.symbol = None
         self.api_key = os.getenv("OpenAI_API_KEY")
-        self.client = OpenAI(api_key=self.api_key)
+        # OPENAI_BASE_URL を指定すると互換APIのサーバー（負荷試験のスタンドインなど）に接続する
+        self.client = get_client(
+            "openai", lambda: OpenAI(api_key=self.api_key, base_url=os.getenv("OPENAI_BASE_URL") or None)
+        )
 
     # 企業名から証券コード（日本株）またはティッカーシンボル（米国株）を取得する関数
     def getSymbol(self, company_name):
@@ -43,6 +48,42 @@ class ChatGPT:
         return self.symbol
     
     
+    # 複数の企業名をまとめて1回の問い合わせでシンボルに変換する関数
+    # 戻り値は {企業名: シンボル}（企業名でないものは 'Invalid'）
+    def getSymbols(self, company_names):
+        response = self.client.chat.completions.create(
+            model="gpt-4o-mini",
+            response_format={"type": "json_object"},
+            messages=[
+                {
+                    "role": "system",
+                    "content": """
+                        JSON配列で渡される企業名それぞれについて、以下のルールに従って返答してください：
+                        1. 企業名の場合、該当する証券コード（日本株）またはティッカーシンボル（米国株）を、英数字のみで返答してください（例：7203, AAPL）。
+                        2. すでに企業コード、ティッカーの場合は、渡された値をそのまま返答してください。
+                        3. 企業名ではない場合は 'Invalid' と返答してください。
+                        4. 入力の企業名をキー、回答を値とするJSONオブジェクトだけを返答してください。
+                        """,
+                },
+                {
+                    "role": "user",
+                    "content": json.dumps(list(company_names), ensure_ascii=False),
+                },
+            ],
+        )
+        content = response.choices[0].message.content
+        try:
+            symbols = json.loads(content or "{}")
+        except ValueError:
+            return {}
+        if not isinstance(symbols, dict):
+            return {}
+        return {
+            str(name): str(symbol).strip()
+            for name, symbol in symbols.items()
+            if isinstance(symbol, (str, int))
+        }
+
     # 企業概要の英文を日本語に翻訳する関数
     def getTranslation(self, text):   
         if text == "N/A" or text == "":
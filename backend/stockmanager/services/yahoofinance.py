@@ -11,6 +11,47 @@ def safe_round(value, digits=2):
         return "N/A"
 
 
+# 各指標がどの入力（info・貸借対照表・損益計算書の項目）から計算されるか
+# 再取得時は入力が変わった指標だけを計算し直す（get_input_fingerprint / changed_metrics）
+METRIC_INPUTS = {
+    "企業名": {"info": ["shortName"]},
+    "株価": {"info": ["regularMarketPrice"]},
+    "粗利率": {"info": ["grossMargins"]},
+    "営業利益率": {"info": ["operatingMargins"]},
+    "EBITDAマージン": {"info": ["ebitdaMargins"]},
+    "純利益率": {"financials": ["Net Income", "Total Revenue"]},
+    "PER": {"info": ["forwardPE"]},
+    "PBR": {"info": ["priceToBook"]},
+    "ROE": {"info": ["returnOnEquity"]},
+    "ROA": {"info": ["returnOnAssets"]},
+    "ROIC": {"financials": ["EBIT", "Tax Rate For Calcs"], "balance_sheet": ["Invested Capital"]},
+    "自己資本比率": {"balance_sheet": ["Stockholders Equity", "Total Assets"]},
+    "流動比率": {"balance_sheet": ["Current Assets", "Current Liabilities"]},
+    "当座比率": {"balance_sheet": ["Current Assets", "Inventory", "Current Liabilities"]},
+    "固定比率": {"balance_sheet": ["Net Tangible Assets", "Stockholders Equity"]},
+    "固定長期適合率": {"balance_sheet": ["Net Tangible Assets", "Stockholders Equity", "Long Term Debt"]},
+    "負債比率": {"balance_sheet": ["Total Liabilities Net Minority Interest", "Total Assets"]},
+    "ネットD/Eレシオ": {"balance_sheet": ["Total Debt", "Cash And Cash Equivalents", "Stockholders Equity"]},
+}
+# 指標以外で、変わったら後続の処理が必要になる入力
+CLASSIFICATION_INPUTS = {"sector": {"info": ["sector"]}, "industry": {"info": ["industry"]}}
+OVERVIEW_INPUTS = {"WEBサイト": {"info": ["website"]}, "企業概要": {"info": ["longBusinessSummary"]}}
+
+
+# 前回と今回の入力を比べ、入力が変わった項目名を返す関数
+def changed_metrics(previous_fingerprint, fingerprint, graph=METRIC_INPUTS):
+    changed = []
+    for name, inputs in graph.items():
+        for source, keys in inputs.items():
+            if any(
+                previous_fingerprint.get(f"{source}:{key}") != fingerprint.get(f"{source}:{key}")
+                for key in keys
+            ):
+                changed.append(name)
+                break
+    return changed
+
+
 # 財務諸表の項目が存在しない場合はNoneを返す関数
 def get_values_or_error(df, keys, source_name=""):
     values = {}
@@ -43,6 +84,15 @@ def extract_and_validate(values_dict, keys, allow_zero_divisor=False):
         return None
 
 
+# 証券コード（数字）なら東証の .T をつけて yfinance の Ticker を作る関数
+def get_ticker(symbol):
+    if isinstance(symbol, int) or (isinstance(symbol, str) and symbol.isdigit()):
+        # 数字（証券コード）なら.Tをつける（日本株）
+        return yf.Ticker(f"{symbol}.T")
+    # それ以外（ティッカーそのまま、例: AAPL, HMC）
+    return yf.Ticker(symbol)
+
+
 # 財務諸表を取得するクラス
 class CompanyFinancialsFetcher:
     def __init__(self, symbol):
@@ -54,14 +104,7 @@ class CompanyFinancialsFetcher:
 
     # yfinanceを利用して財務諸表を取得する関数
     def getCompanyFinancials(self):
-        if isinstance(self.symbol, int) or (
-            isinstance(self.symbol, str) and self.symbol.isdigit()
-        ):
-            # 数字（証券コード）なら.Tをつける（日本株）
-            stock = yf.Ticker(f"{self.symbol}.T")
-        else:
-            # それ以外（ティッカーそのまま、例: AAPL, HMC）
-            stock = yf.Ticker(self.symbol)
+        stock = get_ticker(self.symbol)
 
         self.company_info = stock.info
         self.company_bs = stock.balance_sheet
@@ -167,42 +210,73 @@ class CompanyFinancialsFetcher:
         return safe_round(total_debt / (cash_and_cash_equivalents + stockholders_equity) * 100)
 
 
-    # 上記の項目をJSONデータセットにまとめる関数
-    def get_all_metrics(self):
+    # 指標名 → その指標を計算する関数
+    def metric_calculators(self):
+        info = self.company_info
+        currency_symbol = "\u00a5" if self.symbol_type == int else "$"
+
+        def price():
+            value = info.get("regularMarketPrice")
+            return f"{currency_symbol}{value}" if value is not None else "N/A"
+
+        return {
+            "企業名": lambda: info.get("shortName", "N/A"),
+            "株価": price,
+            "粗利率": lambda: safe_round(info.get("grossMargins", 0) * 100),
+            "営業利益率": lambda: safe_round(info.get("operatingMargins", 0) * 100),
+            "EBITDAマージン": lambda: safe_round(info.get("ebitdaMargins", 0) * 100),
+            "純利益率": self.calculateProfitMargin,
+            "PER": lambda: safe_round(info.get("forwardPE", 0)),
+            "PBR": lambda: safe_round(info.get("priceToBook", 0)),
+            "ROE": lambda: safe_round(info.get("returnOnEquity", 0) * 100),
+            "ROA": lambda: safe_round(info.get("returnOnAssets", 0) * 100),
+            "ROIC": self.calculateROIC,
+            "自己資本比率": self.calculateEquityRatio,
+            "流動比率": self.calculateCurrentRatio,
+            "当座比率": self.calculateQuickRatio,
+            "固定比率": self.calculateFixedRatio,
+            "固定長期適合率": self.calculateFixedLongTermAppropriatenessRatio,
+            "負債比率": self.calculateDebtRatio,
+            "ネットD/Eレシオ": self.calculateNetDERatio,
+        }
+
+    # 指定した指標だけを計算する関数
+    def get_metrics(self, names):
         if self.company_bs is None or self.company_pl is None or self.company_info is None:
             raise ValueError("先に getCompanyFinancials() を呼び出してください。")
 
-        metrics = {}
+        calculators = self.metric_calculators()
+        return {name: calculators[name]() for name in names}
 
-        metrics["企業名"] = self.company_info.get("shortName", "N/A")
+    # 上記の項目をJSONデータセットにまとめる関数
+    def get_all_metrics(self):
+        return self.get_metrics(METRIC_INPUTS)
 
-        price = self.company_info.get("regularMarketPrice")
-        currency_symbol = "\u00a5" if self.symbol_type == int else "$"
-        metrics["株価"] = f"{currency_symbol}{price}" if price is not None else "N/A"
+    # graph の各項目が使う入力の値を {"info:regularMarketPrice": "2650.5", ...} の形で返す関数
+    def get_input_fingerprint(self, graph=METRIC_INPUTS):
+        sources = {"balance_sheet": self.company_bs, "financials": self.company_pl}
+        fingerprint = {}
+        for inputs in graph.values():
+            for source, keys in inputs.items():
+                for key in keys:
+                    if source == "info":
+                        value = self.company_info.get(key)
+                    else:
+                        try:
+                            value = sources[source].loc[key].iloc[0]
+                        except (KeyError, IndexError):
+                            value = None
+                    # NaN 同士も等しく比べられるよう文字列にする
+                    fingerprint[f"{source}:{key}"] = repr(value)
+        return fingerprint
 
-        metrics["粗利率"] = safe_round(self.company_info.get("grossMargins", 0) * 100)
-        metrics["営業利益率"] = safe_round(
-            self.company_info.get("operatingMargins", 0) * 100
-        )
-        metrics["EBITDAマージン"] = safe_round(
-            self.company_info.get("ebitdaMargins", 0) * 100
-        )
-        metrics["純利益率"] = self.calculateProfitMargin()
-        metrics["PER"] = safe_round(self.company_info.get("forwardPE", 0))
-        metrics["PBR"] = safe_round(self.company_info.get("priceToBook", 0))
-        metrics["ROE"] = safe_round(self.company_info.get("returnOnEquity", 0) * 100)
-        metrics["ROA"] = safe_round(self.company_info.get("returnOnAssets", 0) * 100)
-        metrics["ROIC"] = self.calculateROIC()
-        metrics["自己資本比率"] = self.calculateEquityRatio()
-        metrics["流動比率"] = self.calculateCurrentRatio()
-        metrics["当座比率"] = self.calculateQuickRatio()
-        metrics["固定比率"] = self.calculateFixedRatio()
-        metrics["固定長期適合率"] = self.calculateFixedLongTermAppropriatenessRatio()
-        metrics["負債比率"] = self.calculateDebtRatio()
-        metrics["ネットD/Eレシオ"] = self.calculateNetDERatio()
+    # セクター・業種を返す関数（同業他社との比較に使う）
+    def get_classification(self):
+        return {
+            "sector": self.company_info.get("sector"),
+            "industry": self.company_info.get("industry"),
+        }
 
-        return metrics
-    
     # 詳細画面で銘柄の追加情報を表示させる関数
     def get_company_overview(self):
         metrics = {}
@@ -212,4 +286,25 @@ class CompanyFinancialsFetcher:
         metrics["企業概要"] = translation
         
         return metrics
-    
\ No newline at end of file
+
+
+# 日足の株価（OHLCV）を取得するクラス
+class PriceHistoryFetcher:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    # start 以上 end 未満の日足を、日付・始値・高値・安値・終値・出来高の配列のリストで返す関数
+    def get_history(self, start, end):
+        df = get_ticker(self.symbol).history(
+            start=start.isoformat(), end=end.isoformat(), interval="1d", auto_adjust=False
+        )
+        if df.empty:
+            return [[] for _ in range(6)]
+        return [
+            [timestamp.date() for timestamp in df.index],
+            df["Open"].tolist(),
+            df["High"].tolist(),
+            df["Low"].tolist(),
+            df["Close"].tolist(),
+            df["Volume"].tolist(),
+        ]
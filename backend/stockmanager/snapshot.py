@@ -0,0 +1,238 @@
+import fcntl
+import os
+import tempfile
+import threading
+import time
+from django.conf import settings
+
+# get_all_metrics の数値項目（スナップショットの列名 → 指標名）
+NUMERIC_FIELDS = [
+    ("gross_margin", "粗利率"),
+    ("operating_margin", "営業利益率"),
+    ("ebitda_margin", "EBITDAマージン"),
+    ("profit_margin", "純利益率"),
+    ("per", "PER"),
+    ("pbr", "PBR"),
+    ("roe", "ROE"),
+    ("roa", "ROA"),
+    ("roic", "ROIC"),
+    ("equity_ratio", "自己資本比率"),
+    ("current_ratio", "流動比率"),
+    ("quick_ratio", "当座比率"),
+    ("fixed_ratio", "固定比率"),
+    ("fixed_long_term_ratio", "固定長期適合率"),
+    ("debt_ratio", "負債比率"),
+    ("net_de_ratio", "ネットD/Eレシオ"),
+]
+
+NAME_WIDTH = 64  # 企業名の列の最小の文字数（これより長い企業名があれば書き込み時に広げる）
+
+NOT_AVAILABLE = "N/A"
+NO_DATA = "データなし"
+REOPEN_INTERVAL = 1.0  # ファイルが書き換えられたかを確認する間隔（秒）
+
+
+def snapshot_dtype(name_width=NAME_WIDTH):
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("symbol", "U16"),
+            ("fetched_at", "f8"),  # 指標が変わった時刻（ETag / Last-Modified に使う）
+            ("checked_at", "f8"),  # 上流で最後に確認した時刻（古さの判定に使う）
+            ("name", f"U{name_width}"),
+            ("price_text", "U24"),  # 表示用の株価（例: ¥2650.5）
+            ("price", "f8"),
+            ("currency", "U1"),
+            # 数値項目ごとのビットフラグ（N/A / データなし / 整数）
+            ("not_available", "u4"),
+            ("no_data", "u4"),
+            ("integer", "u4"),
+        ]
+        + [(field, "f8") for field, _ in NUMERIC_FIELDS]
+    )
+
+
+# get_all_metrics の辞書を1行分のタプルに変換する関数
+def metrics_to_row(symbol, metrics, fetched_at, checked_at=None):
+    price_text = str(metrics.get("株価", NOT_AVAILABLE))
+    currency = price_text[0] if price_text[:1] in ("¥", "$") else ""
+    try:
+        price = float(price_text[1:]) if currency else float("nan")
+    except ValueError:
+        price = float("nan")
+
+    not_available = no_data = integer = 0
+    values = []
+    for i, (_, key) in enumerate(NUMERIC_FIELDS):
+        value = metrics.get(key, NOT_AVAILABLE)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            if value == NO_DATA:
+                no_data |= 1 << i
+            else:
+                not_available |= 1 << i
+            values.append(float("nan"))
+            continue
+        if isinstance(value, int):
+            integer |= 1 << i
+        values.append(float(value))
+
+    return (
+        str(symbol),
+        fetched_at,
+        fetched_at if checked_at is None else checked_at,
+        str(metrics.get("企業名", NOT_AVAILABLE)),
+        price_text,
+        price,
+        currency,
+        not_available,
+        no_data,
+        integer,
+        *values,
+    )
+
+
+# スナップショットの1行を get_all_metrics と同じ形の辞書に戻す関数
+def row_to_metrics(row):
+    metrics = {"企業名": str(row["name"]), "株価": str(row["price_text"])}
+    not_available, no_data, integer = int(row["not_available"]), int(row["no_data"]), int(row["integer"])
+    for i, (field, key) in enumerate(NUMERIC_FIELDS):
+        if no_data >> i & 1:
+            metrics[key] = NO_DATA
+        elif not_available >> i & 1:
+            metrics[key] = NOT_AVAILABLE
+        elif integer >> i & 1:
+            metrics[key] = int(row[field])
+        else:
+            metrics[key] = float(row[field])
+    return metrics
+
+
+# 行を最後に確認した時刻（checked_at の列がない古いファイルでは fetched_at）
+def checked_at(rows):
+    return rows["checked_at"] if "checked_at" in rows.dtype.names else rows["fetched_at"]
+
+
+# 既存のファイルの1行を、今の列の並びのタプルに変換する関数
+def upgrade_row(row):
+    values = {name: row[name].item() for name in row.dtype.names}
+    values.setdefault("checked_at", values["fetched_at"])
+    return tuple(values[name] for name in snapshot_dtype().names)
+
+
+# 銘柄ごとの指標を固定長のNumPy構造化配列としてファイルに保存し、各ワーカーがmmapで読むクラス
+# 書き込みは一時ファイル + os.replace で行うので、読み込み側が途中の状態を見ることはない
+class MetricsSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self._array = None
+        self._stat = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self):
+        now = time.monotonic()
+        if self._array is not None and now - self._checked_at < REOPEN_INTERVAL:
+            return self._array
+
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                self._array, self._stat = None, None
+                return None
+
+            key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if self._array is None or key != self._stat:
+                import numpy as np
+
+                self._array = np.load(self.path, mmap_mode="r", allow_pickle=False)
+                self._stat = key
+            return self._array
+
+    def _find(self, array, symbol):
+        import numpy as np
+
+        symbol = str(symbol)
+        i = int(np.searchsorted(array["symbol"], symbol))
+        if i < len(array) and array["symbol"][i] == symbol:
+            return i
+        return None
+
+    # 銘柄の行を返す関数（max_age 秒より前に確認した行は返さない）
+    def get_row(self, symbol, max_age=None):
+        array = self._current()
+        if array is None:
+            return None
+        i = self._find(array, symbol)
+        if i is None:
+            return None
+        row = array[i]
+        if max_age is not None and time.time() - float(checked_at(row)) > max_age:
+            return None
+        return row
+
+    # 複数銘柄の行をまとめて取り出す関数（見つからない銘柄は含まない）
+    def get_rows(self, symbols, max_age=None):
+        import numpy as np
+
+        array = self._current()
+        if array is None or not len(symbols):
+            return np.empty(0, dtype=snapshot_dtype())
+        keys = np.asarray([str(symbol) for symbol in symbols])
+        idx = np.clip(np.searchsorted(array["symbol"], keys), 0, len(array) - 1)
+        found = array["symbol"][idx] == keys
+        rows = array[idx[found]]
+        if max_age is not None:
+            rows = rows[time.time() - checked_at(rows) <= max_age]
+        return rows
+
+    # 取得した指標を既存のスナップショットに反映して書き直す関数
+    # records: {symbol: (metrics, 指標が変わった時刻, 上流で確認した時刻)}
+    def write(self, records):
+        import numpy as np
+
+        updated = {
+            str(symbol): metrics_to_row(symbol, metrics, fetched_at, checked)
+            for symbol, (metrics, fetched_at, checked) in records.items()
+        }
+
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+
+        # 別プロセスの書き込みと重ならないようファイルロックを取る
+        with self._lock, open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            rows = {}
+            if os.path.exists(self.path):
+                existing = np.load(self.path, allow_pickle=False)
+                rows = {str(row["symbol"]): upgrade_row(row) for row in existing}
+            rows.update(updated)
+
+            # 企業名が切り捨てられないよう、列の幅を一番長い企業名に合わせる
+            name_index = snapshot_dtype().names.index("name")
+            name_width = max([NAME_WIDTH] + [len(row[name_index]) for row in rows.values()])
+            array = np.array(
+                [rows[symbol] for symbol in sorted(rows)], dtype=snapshot_dtype(name_width)
+            )
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, array, allow_pickle=False)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+            self._checked_at = 0.0
+        return len(array)
+
+
+_snapshot = None
+
+
+def get_snapshot():
+    global _snapshot
+    if _snapshot is None:
+        _snapshot = MetricsSnapshot(settings.METRICS_SNAPSHOT_PATH)
+    return _snapshot
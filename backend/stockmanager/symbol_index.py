@@ -0,0 +1,78 @@
+import csv
+import os
+import unicodedata
+from types import MappingProxyType
+from django.conf import settings
+from django.core.cache import cache
+from .controller import metrics_cache_key
+from .models import StockSymbol
+from .utils import convert_symbol
+
+
+
+# 企業名の表記ゆれ（全角・半角、大文字・小文字、空白）をそろえる関数
+def normalize_name(name):
+    return "".join(unicodedata.normalize("NFKC", str(name)).casefold().split())
+
+
+# 企業名・シンボルから銘柄を引く読み取り専用の索引
+# gunicorn の preload_app でマスタープロセスが一度だけ作り、ワーカーは fork 後にそのまま共有する
+class SymbolIndex:
+    def __init__(self, entries):
+        by_symbol = {}
+        for symbol, name in entries:
+            by_symbol.setdefault(str(symbol).strip().upper(), name or "")
+
+        self.names = MappingProxyType(by_symbol)
+        self._by_name = MappingProxyType(
+            {normalize_name(name): symbol for symbol, name in by_symbol.items() if name}
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    # 企業名またはシンボルから銘柄を返す関数（見つからなければ None）
+    def lookup(self, text):
+        key = str(text).strip().upper()
+        if key in self.names:
+            return key
+        return self._by_name.get(normalize_name(text))
+
+
+def read_symbol_file(path=None):
+    path = path or settings.SYMBOL_INDEX_PATH
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [(row["symbol"], row.get("name")) for row in csv.DictReader(f) if row.get("symbol")]
+
+
+# 銘柄一覧ファイルと、お気に入り登録済み銘柄（キャッシュ中の企業名）から索引を作る関数
+def build_symbol_index():
+    entries = read_symbol_file()
+
+    watched = list(StockSymbol.objects.values_list("symbol", flat=True).distinct())
+    keys = {metrics_cache_key(convert_symbol(symbol)): symbol for symbol in watched}
+    cached = cache.get_many(list(keys))
+    for key, symbol in keys.items():
+        metrics = cached.get(key)
+        name = metrics.get("企業名") if isinstance(metrics, dict) else None
+        entries.append((symbol, name if name != "N/A" else None))
+
+    return SymbolIndex(entries)
+
+
+_index = None
+
+
+# 索引を作ってプロセスに保持する関数（gunicorn の when_ready から呼ぶ）
+def load_symbol_index():
+    global _index
+    _index = build_symbol_index()
+    return _index
+
+
+def get_symbol_index():
+    if _index is None:
+        return load_symbol_index()
+    return _index
@@ -1,10 +1,15 @@
 from django.urls import path
-from .views import MainView, SearchSymbolView, FetchCompanyDataView, SaveStockSymbolView, RemoveStockSymbolView
+from .views import MainView, MainStreamView, SearchSymbolView, BulkSearchSymbolView, FetchCompanyDataView, SavedStatusView, SaveStockSymbolView, RemoveStockSymbolView, PortfolioView, PriceHistoryView
 
 urlpatterns = [
     path('main/', MainView.as_view(), name='main'),
+    path('main/stream/', MainStreamView.as_view(), name='main_stream'),
     path('search/', SearchSymbolView.as_view(), name='search'),
+    path('search/bulk/', BulkSearchSymbolView.as_view(), name='search_bulk'),
     path('fetch/', FetchCompanyDataView.as_view(), name='fetch'),
+    path('history/', PriceHistoryView.as_view(), name='history'),
+    path('saved/', SavedStatusView.as_view(), name='saved'),
     path('save/', SaveStockSymbolView.as_view(), name='save'),
     path('remove/', RemoveStockSymbolView.as_view(), name='remove'),
+    path('portfolio/', PortfolioView.as_view(), name='portfolio'),
 ]
@@ -1,48 +1,161 @@
-from django.core.cache import cache
+import json
+import hashlib
+from decimal import Decimal, InvalidOperation
+import orjson
+from django.db import IntegrityError, transaction
+from django.http import StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
+from accounts.authentication import CachedJWTAuthentication
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from .controller import search_symbol, fetch_company_data  
+from .controller import (
+    search_symbol,
+    resolve_symbols,
+    fetch_company_data,
+    iter_company_data,
+    get_metrics_versions,
+)
 from .models import StockSymbol
-
-
-# メインページでお気に入り一覧を取得
+from .peers import peer_context, peer_version
+from .portfolio import portfolio_summary
+from .history import (
+    price_history,
+    HISTORY_RANGES,
+    HISTORY_METHODS,
+    DEFAULT_HISTORY_RANGE,
+    DEFAULT_HISTORY_POINTS,
+    MAX_HISTORY_POINTS,
+)
+from .renderers import NDJSONRenderer, EventStreamRenderer
+
+
+DETAIL_MAX_AGE = 60 * 5  # 詳細レスポンスをCDN・プロキシに保持させる秒数
+MAX_BULK_SEARCH = 500  # 一括検索で一度に受け付ける企業名の数
+
+
+# キャッシュ取得時刻から ETag と Last-Modified を作る関数（未取得の銘柄があれば作らない）
+def metrics_validators(versions, *extra):
+    if any(version is None for version in versions.values()):
+        return None, None
+    source = json.dumps([list(versions.items()), extra], ensure_ascii=False, default=str)
+    etag = f'"{hashlib.sha1(source.encode()).hexdigest()}"'
+    last_modified = int(max(versions.values())) if versions else None
+    return etag, last_modified
+
+
+# 条件付きリクエストに一致すれば 304 を返す関数
+def not_modified_response(request, etag, last_modified):
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    if etag is not None:
+        response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    return response
+
+
+# 保有株数・取得単価を Decimal に変換する関数（未指定なら None、不正な値は ValueError）
+def parse_position_value(value, field_name, name):
+    if value in (None, ""):
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"{name}は数値で指定してください")
+    if not number.is_finite() or number < 0:
+        raise ValueError(f"{name}は0以上の数値で指定してください")
+
+    # DecimalField の桁数に収まらない値は保存時のエラー（500）になるので、ここで弾く（小数部は保存時と同じく丸める）
+    field = StockSymbol._meta.get_field(field_name)
+    integer_digits = field.max_digits - field.decimal_places
+    try:
+        number = number.quantize(Decimal(1).scaleb(-field.decimal_places))
+    except InvalidOperation:
+        number = None
+    if number is None or number.adjusted() >= integer_digits:
+        raise ValueError(f"{name}は整数部{integer_digits}桁以内で指定してください")
+    return number
+
+
+# お気に入り一覧の1銘柄分のレスポンスを作る関数
+def watchlist_entry(symbol, metrics, error):
+    if error is not None:
+        return {
+            "symbol": symbol,
+            "error": f"{symbol} のデータ取得に失敗しました: {str(error)}",
+            "is_saved": True,
+        }
+    return {
+        "symbol": symbol,
+        "metrics": metrics,
+        "is_saved": True,  # ← 保存されてるものだけなのでTrueでOK
+    }
+
+
+# お気に入り一覧を列指向（キーは1回だけ、値は配列）にまとめる関数
+def columnar_results(all_data):
+    columns = []
+    for entry in all_data:
+        for key in entry.get("metrics", {}):
+            if key not in columns:
+                columns.append(key)
+
+    symbols, rows, errors = [], [], []
+    for entry in all_data:
+        if "metrics" in entry:
+            symbols.append(entry["symbol"])
+            rows.append([entry["metrics"].get(key) for key in columns])
+        else:
+            errors.append({"symbol": entry["symbol"], "error": entry["error"]})
+
+    return {"columns": columns, "symbols": symbols, "rows": rows, "errors": errors}
+
+
+# メインページでお気に入り一覧を取得（?layout=columnar で列指向の軽量レスポンス）
 class MainView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         try:
             # ログインユーザーのお気に入り銘柄を取得
-            symbols = StockSymbol.objects.filter(user=request.user).values_list(
-                "symbol", flat=True
+            symbols = list(
+                StockSymbol.objects.filter(user=request.user).values_list(
+                    "symbol", flat=True
+                )
             )
 
-            all_data = []
-            for symbol in symbols:
-                try:
-                    metrics = fetch_company_data(symbol, request, include_overview=False) # 一覧画面で銘柄の追加情報を表示させない
-                    all_data.append(
-                        {
-                            "symbol": symbol,
-                            "metrics": metrics,
-                            "is_saved": True,  # ← 保存されてるものだけなのでTrueでOK
-                        }
-                    )
-                except Exception as e:
-                    all_data.append(
-                        {
-                            "symbol": symbol,
-                            "error": f"{symbol} のデータ取得に失敗しました: {str(e)}",
-                            "is_saved": True,
-                        }
-                    )
-
-            return Response({"results": all_data}, status=status.HTTP_200_OK)
+            columnar = request.query_params.get("layout") == "columnar"
+
+            # 前回のポーリングから指標が変わっていなければ 304 を返す
+            etag, last_modified = metrics_validators(get_metrics_versions(symbols), columnar)
+            not_modified = not_modified_response(request, etag, last_modified)
+            if not_modified is not None:
+                return not_modified
+
+            # 並列に取得し、表示順は登録順に戻す
+            entries = {
+                symbol: watchlist_entry(symbol, metrics, error)
+                for symbol, metrics, error in iter_company_data(
+                    symbols, request, include_overview=False  # 一覧画面で銘柄の追加情報を表示させない
+                )
+            }
+            all_data = [entries[symbol] for symbol in symbols]
+
+            body = columnar_results(all_data) if columnar else {"results": all_data}
+            response = Response(body, status=status.HTTP_200_OK)
+            set_validators(response, *metrics_validators(get_metrics_versions(symbols), columnar))
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
 
         except Exception as e:
             return Response(
@@ -50,6 +163,37 @@ class MainView(APIView):
             )
 
 
+# メインページのお気に入り一覧を取得できた銘柄から順に送信（NDJSON / Server-Sent Events）
+class MainStreamView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [NDJSONRenderer, EventStreamRenderer]
+
+    def get(self, request):
+        symbols = list(
+            StockSymbol.objects.filter(user=request.user).values_list(
+                "symbol", flat=True
+            )
+        )
+        use_sse = "text/event-stream" in request.headers.get("Accept", "")
+
+        def stream():
+            for symbol, metrics, error in iter_company_data(symbols, request):
+                line = orjson.dumps(watchlist_entry(symbol, metrics, error)).decode()
+                yield f"data: {line}\n\n" if use_sse else f"{line}\n"
+            if use_sse:
+                yield "event: end\ndata: {}\n\n"
+
+        response = StreamingHttpResponse(
+            stream(),
+            content_type="text/event-stream" if use_sse else "application/x-ndjson",
+        )
+        # プロキシにバッファリングさせず、届いた行をすぐにクライアントへ流す
+        response["Cache-Control"] = "no-cache, no-transform"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
 # 検索ボックスの企業名からシンボルを取得
 class SearchSymbolView(APIView):
     permission_classes = [AllowAny]
@@ -75,7 +219,34 @@ class SearchSymbolView(APIView):
             )
 
 
+# 企業名のリストをまとめてシンボルに変換（ポートフォリオの取り込み用）
+class BulkSearchSymbolView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        company_names = request.data.get("company_names")
+
+        if not isinstance(company_names, list) or not company_names:
+            return Response(
+                {"error": "company_names を配列で指定してください"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(company_names) > MAX_BULK_SEARCH:
+            return Response(
+                {"error": f"company_names は{MAX_BULK_SEARCH}件までです"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            return Response({"results": resolve_symbols(company_names)})
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 # 銘柄詳細ページで銘柄詳細情報を取得
+# 未ログインのレスポンスはユーザーに依存しないため、CDN・プロキシで共有キャッシュできる
 class FetchCompanyDataView(APIView):
     permission_classes = [AllowAny]  # ← ここを変更（認証不要に）
 
@@ -83,30 +254,105 @@ class FetchCompanyDataView(APIView):
         symbol = request.query_params.get("symbol")
 
         try:
-            metrics = fetch_company_data(symbol, request, include_overview=True) # 詳細画面で銘柄の追加情報を表示させる
-            
-            # デフォルトは False（ログインしてない or お気に入りじゃない）
-            is_saved = False
+            # お気に入り登録状況は SavedStatusView で別に返し、ログインの有無に関わらず同じレスポンス・ETag にする
+            # 同業他社の集計が変わってもパーセンタイルが古くならないよう ETag に含める
+            etag, last_modified = metrics_validators(
+                get_metrics_versions([symbol], include_overview=True), peer_version(symbol)
+            )
+            not_modified = not_modified_response(request, etag, last_modified)
 
-            if request.user.is_authenticated:
-                is_saved = StockSymbol.objects.filter(user=request.user, symbol=symbol).exists()
+            if not_modified is None:
+                metrics = fetch_company_data(symbol, request, include_overview=True) # 詳細画面で銘柄の追加情報を表示させる
+                etag, last_modified = metrics_validators(
+                    get_metrics_versions([symbol], include_overview=True), peer_version(symbol)
+                )
+                response = Response(
+                    {
+                        "symbol": symbol,
+                        "metrics": metrics,
+                        "peers": peer_context(symbol, metrics),  # セクター・業種内の統計と順位
+                    }
+                )
+                set_validators(response, etag, last_modified)
+            else:
+                response = not_modified
 
+            patch_cache_control(response, public=True, max_age=DETAIL_MAX_AGE)
+            return response
+        except Exception as e:
             return Response(
-                {
-                    "symbol": symbol,
-                    "is_saved": is_saved,
-                    "metrics": metrics,
-                }
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
+# 銘柄詳細ページの株価チャート（?symbol=&range=1y&points=200&method=lttb|minmax）
+# 確定した月の日足はディスクに保存済みのブロックから読み、指定した点数に間引いて返す
+class PriceHistoryView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        symbol = request.query_params.get("symbol")
+        period = request.query_params.get("range", DEFAULT_HISTORY_RANGE)
+        method = request.query_params.get("method", "lttb")
+
+        if not symbol:
+            return Response(
+                {"error": "symbolが必要です"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if period not in HISTORY_RANGES:
+            return Response(
+                {"error": f"rangeは {', '.join(HISTORY_RANGES)} のいずれかを指定してください"},
+                status=status.HTTP_400_BAD_REQUEST,
             )
+        if method not in HISTORY_METHODS:
+            return Response(
+                {"error": f"methodは {', '.join(HISTORY_METHODS)} のいずれかを指定してください"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            points = int(request.query_params.get("points", DEFAULT_HISTORY_POINTS))
+        except ValueError:
+            points = 0
+        if not 3 <= points <= MAX_HISTORY_POINTS:
+            return Response(
+                {"error": f"pointsは3〜{MAX_HISTORY_POINTS}で指定してください"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            response = Response(price_history(symbol, period, points, method))
+            patch_cache_control(response, public=True, max_age=DETAIL_MAX_AGE)
+            return response
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
-# symbolだけ保存（お気に入り登録）
+# ログインユーザーが銘柄をお気に入り登録しているかを取得（詳細レスポンスを共有キャッシュするため分離）
+class SavedStatusView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        symbol = request.query_params.get("symbol")
+
+        if not symbol:
+            return Response(
+                {"error": "symbolが必要です"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        is_saved = StockSymbol.objects.filter(user=request.user, symbol=symbol).exists()
+        response = Response({"symbol": symbol, "is_saved": is_saved})
+        patch_cache_control(response, private=True, no_store=True)
+        return response
+
+
+# symbolを保存（お気に入り登録、保有株数・取得単価も任意で登録できる）
 class SaveStockSymbolView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -117,14 +363,29 @@ class SaveStockSymbolView(APIView):
                 {"error": "symbolが必要です"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        # 保有株数・取得単価（任意）
         try:
-            # 重複登録チェック（任意）
-            if StockSymbol.objects.filter(symbol=symbol, user=request.user).exists():
+            position = {
+                "quantity": parse_position_value(request.data.get("quantity"), "quantity", "保有株数"),
+                "cost_basis": parse_position_value(request.data.get("cost_basis"), "cost_basis", "取得単価"),
+            }
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        position = {key: value for key, value in position.items() if value is not None}
+
+        try:
+            # 登録済みなら保有情報だけ更新する（確認と書き込みを分けず、UPDATE の件数で判定）
+            if position and StockSymbol.objects.filter(symbol=symbol, user=request.user).update(**position):
+                return Response({"message": "保有情報を更新しました"}, status=status.HTTP_200_OK)
+
+            # 重複登録は unique_together の制約違反で判定する
+            try:
+                with transaction.atomic():
+                    StockSymbol.objects.create(symbol=symbol, user=request.user, **position)
+            except IntegrityError:
                 return Response(
                     {"message": "すでに登録されています"}, status=status.HTTP_200_OK
                 )
-
-            StockSymbol.objects.create(symbol=symbol, user=request.user)
             return Response({"message": "保存成功！"}, status=status.HTTP_201_CREATED)
 
         except Exception as e:
@@ -133,9 +394,32 @@ class SaveStockSymbolView(APIView):
             )
 
 
+# お気に入り銘柄の保有株数・取得単価からポートフォリオ全体の評価額・加重平均指標を通貨別に集計
+# キャッシュ・スナップショットにある指標だけを使い、上流には問い合わせない
+class PortfolioView(APIView):
+    authentication_classes = [CachedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            positions = list(
+                StockSymbol.objects.filter(user=request.user)
+                .order_by("created_at")
+                .values_list("symbol", "quantity", "cost_basis")
+            )
+            response = Response(portfolio_summary(positions), status=status.HTTP_200_OK)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        except Exception as e:
+            return Response(
+                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+
 # symbolだけ削除（お気に入り削除）
 class RemoveStockSymbolView(APIView):
-    authentication_classes = [JWTAuthentication]
+    authentication_classes = [CachedJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     def post(self, request):
@@ -147,17 +431,11 @@ class RemoveStockSymbolView(APIView):
             )
 
         try:
-            # 該当のレコードを取得して削除
-            favorite = StockSymbol.objects.filter(
+            # 該当のレコードを1回の DELETE で削除し、削除件数で登録有無を判定
+            deleted, _ = StockSymbol.objects.filter(
                 symbol=symbol, user=request.user
-            ).first()
-            if favorite:
-                favorite.delete()
-
-                # キャッシュ削除
-                cache_key = f"metrics_{request.user.id}_{symbol}"
-                cache.delete(cache_key)
-
+            ).delete()
+            if deleted:
                 return Response({"message": "削除しました"}, status=status.HTTP_200_OK)
             else:
                 return Response(
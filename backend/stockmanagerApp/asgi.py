@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "stockmanagerApp.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Djangoの初期化後に読み込む（モデルを参照するため）
+from stockmanager.realtime import websocket_application  # noqa: E402
+
+
+# WebSocket は株価配信アプリへ、それ以外は Django へ振り分ける
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        await websocket_application(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
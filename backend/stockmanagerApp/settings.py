@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    "stockmanager.middleware.StreamingAwareGZipMiddleware",  # Accept-Encoding に応じてレスポンスを圧縮（ストリーミングは除く）
+    "stockmanager.profiling.RequestProfilingMiddleware",  # 遅いリクエストの記録・任意のプロファイル
     'django.middleware.common.CommonMiddleware',
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -119,12 +121,32 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# パスワード照合はワーカーを占有しないよう専用スレッドで行う
+AUTHENTICATION_BACKENDS = ['accounts.backends.PooledHashingModelBackend']
+
+# 先頭のハッシュ方式で保存する。古い方式のパスワードはログイン時に自動で再ハッシュされる
+PASSWORD_HASHERS = list(dict.fromkeys([
+    os.environ.get('PASSWORD_HASHER', 'django.contrib.auth.hashers.PBKDF2PasswordHasher'),
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]))
+
+PASSWORD_HASHING_CONCURRENCY = int(os.environ.get('PASSWORD_HASHING_CONCURRENCY', 2))
+PASSWORD_HASHING_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASHING_QUEUE_SIZE', 8))
+
 ACCOUNT_AUTHENTICATION_METHOD = 'email'
 
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'stockmanager.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
@@ -134,19 +156,86 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),     # ← 7日間自動ログイン継続
     "ROTATE_REFRESH_TOKENS": True,                  # ← リフレッシュするたびに新しいrefreshトークン発行
     "BLACKLIST_AFTER_ROTATION": True,               # ← 古いrefreshトークンは無効化（安全性UP）
+    "TOKEN_OBTAIN_SERIALIZER": "accounts.serializers.CachedTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.CachedTokenRefreshSerializer",
 }
 
+# 他のワーカーで無効化されたrefreshトークンを取り込む間隔（秒）
+TOKEN_BLACKLIST_REFRESH_INTERVAL = 5
+
 
 
+# gunicornの全ワーカーと warm_cache コマンドで同じキャッシュを共有する
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", os.path.join(BASE_DIR, ".cache")),
+        # 1銘柄あたり約9件（一覧・詳細の指標／取得時刻／前回の入力、取り直しのロック、業種、当月の株価）
+        # ＋業種集計（約320件）＋企業名→シンボルの記録。既定の300件では数十銘柄で間引かれるので、
+        # 約1000銘柄分の10000件にする（FileBasedCache は書き込みごとにディレクトリを数えるので大きくしすぎない）
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000))},
     }
 }
 
 
 
+# 一覧用の財務指標のスナップショット（全ワーカーが mmap で共有する）
+METRICS_SNAPSHOT_PATH = os.environ.get('METRICS_SNAPSHOT_PATH', os.path.join(BASE_DIR, 'snapshots', 'metrics.npy'))
+
+# 業種集計を更新するときのファイルロックの置き場所（同じホストの全プロセスで共有する）
+PEER_LOCK_DIR = os.environ.get('PEER_LOCK_DIR', os.path.join(BASE_DIR, 'locks'))
+
+# 株価履歴（銘柄・月ごとの日足ブロック）の保存先
+PRICE_HISTORY_DIR = os.environ.get('PRICE_HISTORY_DIR', os.path.join(BASE_DIR, 'history'))
+
+# 銘柄一覧（symbol,name のCSV）。企業名検索でChatGPTを呼ぶ前に参照する
+SYMBOL_INDEX_PATH = os.environ.get('SYMBOL_INDEX_PATH', os.path.join(BASE_DIR, 'data', 'symbols.csv'))
+
+# 上流（yfinance）に問い合わせる前に待つ秒数
+UPSTREAM_FETCH_DELAY = float(os.environ.get('UPSTREAM_FETCH_DELAY', 3))
+
+# 外部サービスの差し替え（"サービス名=モジュール:クラス" をカンマ区切り）
+# 例: financials=stockmanager.loadtest.clients:StandInFinancialsFetcher（負荷試験でローカルのスタンドインを使う）
+SERVICE_OVERRIDES = dict(
+    item.split('=', 1) for item in os.environ.get('SERVICE_OVERRIDES', '').split(',') if item
+)
+# スタンドインの yfinance 互換サーバー（manage.py run_standins / loadtest）
+LOADTEST_UPSTREAM_URL = os.environ.get('LOADTEST_UPSTREAM_URL', 'http://127.0.0.1:8765')
+
+# リクエストのプロファイル（X-Profile-Request ヘッダーが REQUEST_PROFILING_TOKEN と一致、またはサンプリング）
+REQUEST_PROFILING_ENABLED = os.environ.get('REQUEST_PROFILING_ENABLED', 'false').lower() == 'true'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILING_SAMPLE_RATE', 0))
+REQUEST_PROFILING_TOKEN = os.environ.get('REQUEST_PROFILING_TOKEN', '')
+# これより遅いリクエストは銘柄ごとの取得元・SQL回数とともに slow request ログに残す（ミリ秒）
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('SLOW_REQUEST_THRESHOLD_MS', 1000))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+        # slow request ログは1行1JSON
+        'json_line': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'simple'},
+        'slow_requests': (
+            {'class': 'logging.handlers.WatchedFileHandler', 'filename': os.environ['SLOW_REQUEST_LOG_PATH'], 'formatter': 'json_line'}
+            if os.environ.get('SLOW_REQUEST_LOG_PATH')
+            else {'class': 'logging.StreamHandler', 'formatter': 'json_line'}
+        ),
+    },
+    'loggers': {
+        'stockmanager': {'handlers': ['console'], 'level': 'INFO'},
+        'accounts': {'handlers': ['console'], 'level': 'INFO'},
+        'stockmanager.slow_requests': {'handlers': ['slow_requests'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
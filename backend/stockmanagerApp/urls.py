@@ -17,12 +17,12 @@ Including another URLconf
 
 from django.contrib import admin
 from django.urls import path, include
-from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework_simplejwt.views import TokenRefreshView
+from accounts.views import LoginView
 
 urlpatterns = [
     # JWT トークン取得
-    path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('api/token/', LoginView.as_view(), name='token_obtain_pair'),
     # リフレッシュトークン
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { useParams, Link } from "react-router-dom";
 import { useNavigate } from "react-router-dom";
+import axios from "axios";
 import api from "../api/axios";
 import "../styles/Common.css";
 import "../styles/StockDetailPage.css";
@@ -26,30 +27,34 @@ export default function StockDetailPage() {
         .catch(() => setUsername(null));
     }
 
-    // 銘柄の詳細情報を取得
+    // 銘柄の詳細情報を取得（認証なしで取得し、CDN・プロキシのキャッシュを使えるようにする）
     const fetchDetails = async () => {
       try {
-        const response = await api.get(
+        const response = await axios.get(
           `${process.env.REACT_APP_API_URL}/stockmanager/fetch/`,
           { params: { symbol } },
         );
         setData(response.data);
-        setIsSaved(response.data.is_saved || false); // ← API側が保存済み情報も返してたらこれ
       } catch (err) {
         setError("銘柄の詳細情報を取得できませんでした。");
       }
     };
 
-    fetchDetails();
-  }, [symbol]);
-
+    // お気に入り登録済みかどうかはログイン時のみ別途取得
+    const fetchSavedStatus = async () => {
+      try {
+        const response = await api.get("stockmanager/saved/", { params: { symbol } });
+        setIsSaved(response.data.is_saved || false);
+      } catch (err) {
+        setIsSaved(false);
+      }
+    };
 
-  // data が更新されたら isSaved をセット
-  useEffect(() => {
-    if (data && typeof data.is_saved !== "undefined") {
-      setIsSaved(data.is_saved);
+    fetchDetails();
+    if (token) {
+      fetchSavedStatus();
     }
-  }, [data]);
+  }, [symbol]);
 
 
   // 検索ボタンを押したら、検索ワードをAPIに送信して、銘柄のシンボルを取得